@@ -1,3 +1,9 @@
 from django.contrib import admin
+from api.models import IdempotencyKey
 
 # Register your models here.
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'scope', 'user', 'state', 'response_status', 'lease_expires_at', 'expires_at']
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from api import caches
+
+# the user fields authentication and permission checks read
+SNAPSHOT_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser', 'role')
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the token's user from the cache, so
+    authenticated requests don't start with a query for the user row.
+    Only a snapshot is cached: the SNAPSHOT_FIELDS and the token version
+    (the password hash digest simplejwt puts in revocable tokens), never the
+    password hash itself. The other fields are deferred and load together in
+    one query when a view reads them.
+
+    Entries live for AUTH_USER_CACHE_TIMEOUT seconds and are dropped whenever
+    the user is saved or deleted (see users/signals.py); updates that bypass
+    `save()` (queryset `.update()`) are picked up when the entry expires.
+    With a process-local cache backend, the shipped default, that drop
+    wouldn't reach the other workers, so the cache is not used at all: the
+    feature is opt-in through a shared CACHE_BACKEND.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not caches.is_shared():
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            user = super().get_user(validated_token)
+            cache.set(key, {
+                'fields': {field: getattr(user, field) for field in SNAPSHOT_FIELDS},
+                'token_version': get_md5_hash_password(user.password),
+            }, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+            return user
+
+        # the same checks simplejwt runs on a freshly loaded user
+        # from_db takes the values in model field order
+        fields = [field.attname for field in self.user_model._meta.concrete_fields
+                  if field.attname in snapshot['fields']]
+        user = self.user_model.from_db(
+            self.user_model._base_manager.db, fields,
+            [snapshot['fields'][field] for field in fields])
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM) != snapshot['token_version']:
+            raise AuthenticationFailed(
+                "The user's password has been changed.", code="password_changed")
+        return user
@@ -0,0 +1,12 @@
+from django.conf import settings
+
+# backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def is_shared(alias='default'):
+    """Whether every worker process sees the same `alias` cache"""
+    return settings.CACHES.get(alias, {}).get('BACKEND') not in PROCESS_LOCAL_BACKENDS
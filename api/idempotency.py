@@ -0,0 +1,194 @@
+"""
+`Idempotency-Key` support for unsafe endpoints (order creation, payment
+initiation).
+
+The first request with a key claims it by inserting an IdempotencyKey row,
+runs, and stores its response in the row and in the cache. Retries with the
+same key get the stored response back (usually from the cache) instead of
+running the endpoint again. A retry that arrives while the first request is
+still running waits for it (watching the cache, not the database) and replays
+its response. The first request holds the key on a lease of
+IDEMPOTENCY_LEASE_TIMEOUT seconds: if its worker is killed or times out, the
+row can't stay in progress for the key's lifetime, as a retry takes the key
+over once the lease has run out. Keys expire after IDEMPOTENCY_KEY_TTL
+seconds; `purge_idempotency_keys` deletes expired rows.
+"""
+import json
+import time
+from datetime import timedelta
+from hashlib import sha256
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from api.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+WAIT_TIMEOUT = 30
+WAIT_POLL_INTERVAL = 0.1
+
+
+def get_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+
+
+def get_lease_timeout():
+    return getattr(settings, 'IDEMPOTENCY_LEASE_TIMEOUT', 30)
+
+
+def _cache_key(user_id, scope, key):
+    return f"idempotency:{user_id}:{scope}:{sha256(key.encode()).hexdigest()}"
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return sha256(f"{request.method}|{request.path}|{body}".encode()).hexdigest()
+
+
+def _replay(stored):
+    response = Response(stored['body'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _error(detail, status_code):
+    return Response({"detail": detail}, status=status_code)
+
+
+def _released_key(cache_key):
+    return f"{cache_key}:released"
+
+
+def _stored(record):
+    return {'status': record.response_status, 'body': record.response_body}
+
+
+def _claim(user_id, scope, key, request_hash):
+    """
+    Insert the key row with a fresh lease, or take over an in-progress row
+    whose lease has run out (its request died or hung). Returns `(record,
+    owned)`; `record` is None when the row vanished between the two queries.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=get_lease_timeout())
+    IdempotencyKey.objects.filter(
+        user_id=user_id, scope=scope, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user_id=user_id, scope=scope, key=key, request_hash=request_hash,
+                lease_expires_at=lease, expires_at=now + timedelta(seconds=get_ttl())), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(user_id=user_id, scope=scope, key=key).first()
+    if (record is None or record.state != IdempotencyKey.IN_PROGRESS
+            or record.request_hash != request_hash
+            or (record.lease_expires_at is not None and record.lease_expires_at > now)):
+        return record, False
+    # conditional on the lease we saw, so only one retry takes over
+    taken = IdempotencyKey.objects.filter(
+        pk=record.pk, state=IdempotencyKey.IN_PROGRESS,
+        lease_expires_at=record.lease_expires_at,
+    ).update(lease_expires_at=lease)
+    if taken:
+        record.lease_expires_at = lease
+    return record, bool(taken)
+
+
+def _wait_for(cache_key, record, deadline):
+    """
+    Wait for the request holding `record`: its response as soon as it lands
+    in the cache, or None once it released the key, its lease ran out or
+    `deadline` passed. Only the cache is polled; the caller re-reads the row.
+    """
+    lease_left = 0
+    if record.lease_expires_at is not None:
+        lease_left = (record.lease_expires_at - timezone.now()).total_seconds()
+    until = min(deadline, time.monotonic() + max(lease_left, 0))
+    released_key = _released_key(cache_key)
+    lease = str(record.lease_expires_at)
+    while time.monotonic() < until:
+        time.sleep(WAIT_POLL_INTERVAL)
+        found = cache.get_many([cache_key, released_key])
+        if cache_key in found:
+            return found[cache_key]
+        if found.get(released_key) == lease:
+            return None
+    return None
+
+
+def _release(record, cache_key):
+    """Give the key up so a retry can run the request again"""
+    IdempotencyKey.objects.filter(
+        pk=record.pk, lease_expires_at=record.lease_expires_at).delete()
+    cache.set(_released_key(cache_key), str(record.lease_expires_at), WAIT_TIMEOUT)
+
+
+def run(request, scope, handler):
+    """
+    Run `handler()` at most once per (user, scope, Idempotency-Key). Requests
+    without the header, or from anonymous users, just run the handler.
+    """
+    key = request.headers.get(HEADER)
+    if not key or not request.user.is_authenticated:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters",
+                      status.HTTP_400_BAD_REQUEST)
+
+    user_id = request.user.pk
+    request_hash = _request_hash(request)
+    cache_key = _cache_key(user_id, scope, key)
+
+    stored = cache.get(cache_key)
+    if stored is not None:
+        if stored['hash'] != request_hash:
+            return _error(f"{HEADER} was already used with a different request",
+                          status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return _replay(stored)
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        record, owned = _claim(user_id, scope, key, request_hash)
+        if owned:
+            break
+        if record is not None:
+            if record.request_hash != request_hash:
+                return _error(f"{HEADER} was already used with a different request",
+                              status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.state == IdempotencyKey.COMPLETE:
+                return _replay(_stored(record))
+            # coalesce onto the in-flight request
+            stored = _wait_for(cache_key, record, deadline)
+            if stored is not None:
+                return _replay(stored)
+        if time.monotonic() >= deadline:
+            return _error("A request with this Idempotency-Key is still in progress",
+                          status.HTTP_409_CONFLICT)
+
+    try:
+        response = handler()
+    except Exception:
+        _release(record, cache_key)
+        raise
+
+    if response.status_code >= 500 or not hasattr(response, 'data'):
+        # let the client retry failures with the same key
+        _release(record, cache_key)
+        return response
+
+    body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    stored = IdempotencyKey.objects.filter(
+        pk=record.pk, lease_expires_at=record.lease_expires_at,
+    ).update(state=IdempotencyKey.COMPLETE, response_status=response.status_code,
+             response_body=body)
+    # otherwise a retry took the key over after our lease ran out and owns it
+    if stored:
+        cache.set(cache_key, {'hash': request_hash, 'status': response.status_code, 'body': body},
+                  get_ttl())
+    return response
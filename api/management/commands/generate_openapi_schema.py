@@ -0,0 +1,26 @@
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from home_care_hub.schema import SCHEMA_STATIC_PATH, build_schema
+
+DEFAULT_OUTPUT = Path(settings.BASE_DIR) / 'api' / 'static' / SCHEMA_STATIC_PATH
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema into a static file served by WhiteNoise "
+        "(run collectstatic afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(DEFAULT_OUTPUT))
+        parser.add_argument('--url', help=(
+            "Absolute API URL the schema advertises, e.g. the production BACKEND_URL; "
+            "by default it names no host and clients use the one serving the docs"))
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        schema = build_schema(options['url'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(schema)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(schema)} bytes to {output}"))
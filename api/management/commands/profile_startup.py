@@ -0,0 +1,72 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter: a cold start up to the first response
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+ready = time.perf_counter()
+from django.test import Client
+response = Client(HTTP_HOST=sys.argv[2]).get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({'status': response.status_code, 'setup': ready - started,
+                  'first_response': done - ready}))
+"""
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure a cold start in a fresh interpreter: time to load the WSGI "
+        "app and serve a first request, and the import cost per package/module"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/v1/products/',
+                            help="Path of the first request")
+        parser.add_argument('--top', type=int, default=20,
+                            help="Number of packages/modules to list")
+
+    def handle(self, *args, **options):
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'home_care_hub.settings'))
+        probe = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE, options['path'], host],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+        try:
+            timings = json.loads(probe.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            raise CommandError(f"Startup probe failed:\n{probe.stderr[-2000:]}")
+
+        packages = {}
+        modules = []
+        for line in probe.stderr.splitlines():
+            match = IMPORT_LINE.match(line)
+            if not match:
+                continue
+            own, cumulative, indent, name = match.groups()
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + int(own)
+            if len(indent) <= 3:
+                modules.append((int(cumulative), name))
+
+        self.stdout.write(
+            f"settings: {env['DJANGO_SETTINGS_MODULE']}\n"
+            f"app setup: {timings['setup'] * 1000:.0f} ms\n"
+            f"first response ({options['path']} -> {timings['status']}): "
+            f"{timings['first_response'] * 1000:.0f} ms\n"
+            f"total: {(timings['setup'] + timings['first_response']) * 1000:.0f} ms")
+        self.stdout.write("\nimport time per package (self):")
+        for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{micros / 1000:8.1f} ms  {package}")
+        self.stdout.write("\nslowest top-level imports (cumulative):")
+        for micros, name in sorted(modules, reverse=True)[:options['top']]:
+            self.stdout.write(f"{micros / 1000:8.1f} ms  {name}")
@@ -0,0 +1,59 @@
+"""
+Path-aware middleware. The API under `API_PATH_PREFIXES` authenticates with
+JWT only, so it has no use for sessions, messages, CSRF cookies, the auth
+middleware's session user or clickjacking headers; `web_only()` wraps such a
+middleware so its hooks are skipped for API requests while `/admin/` and the
+schema pages keep the full behaviour.
+"""
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+
+def is_api_request(request):
+    return request.path_info.startswith(tuple(getattr(settings, 'API_PATH_PREFIXES', ['/api/'])))
+
+
+def _skip_request(method):
+    def hook(self, request, *args, **kwargs):
+        if is_api_request(request):
+            return None
+        return method(self, request, *args, **kwargs)
+    return hook
+
+
+def _skip_response(method):
+    def hook(self, request, response):
+        if is_api_request(request):
+            return response
+        return method(self, request, response)
+    return hook
+
+
+def web_only(middleware_class):
+    """A subclass of `middleware_class` whose hooks don't run for API requests"""
+    hooks = {}
+    for name in ('process_request', 'process_view', 'process_exception'):
+        if hasattr(middleware_class, name):
+            hooks[name] = _skip_request(getattr(middleware_class, name))
+    for name in ('process_template_response', 'process_response'):
+        if hasattr(middleware_class, name):
+            hooks[name] = _skip_response(getattr(middleware_class, name))
+    hooks['__doc__'] = f"{middleware_class.__name__}, skipped for API requests"
+    return type(f"WebOnly{middleware_class.__name__}", (middleware_class,), hooks)
+
+
+WebOnlySessionMiddleware = web_only(SessionMiddleware)
+WebOnlyCsrfViewMiddleware = web_only(CsrfViewMiddleware)
+WebOnlyAuthenticationMiddleware = web_only(AuthenticationMiddleware)
+WebOnlyMessageMiddleware = web_only(MessageMiddleware)
+WebOnlyXFrameOptionsMiddleware = web_only(XFrameOptionsMiddleware)
+
+
+def show_toolbar(request):
+    """Debug toolbar callback: web pages only, API responses aren't HTML"""
+    from debug_toolbar.middleware import show_toolbar as default_show_toolbar
+    return not is_api_request(request) and default_show_toolbar(request)
@@ -0,0 +1,92 @@
+from hashlib import md5
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list and retrieve.
+    The validators come from one aggregate query (max `conditional_field` and
+    row count) over the same queryset the action would serialize, so a
+    `304 Not Modified` is answered before any serializer work is done.
+    Views with a `conditional_version` keep the validators in the cache under
+    that version instead, so repeated requests run no query at all until a
+    write bumps the version.
+    Views override `list_response` / `retrieve_response` to customize how the
+    full response is built.
+    """
+    conditional_field = 'updated_at'
+    # include the requesting user in the ETag for per-user querysets
+    conditional_per_user = False
+    # callable returning a cache version that every write to the data behind
+    # the view bumps; None runs the aggregate on every request
+    conditional_version = None
+    conditional_timeout = 60 * 15
+
+    def get_conditional_validators(self, queryset):
+        if self.conditional_version is None:
+            return self.compute_conditional_validators(queryset)
+        # read the version first: a write committed meanwhile bumps it again
+        version = self.conditional_version()
+        key = f"conditional:{version}:{md5(self.conditional_scope().encode()).hexdigest()}"
+        validators = cache.get(key)
+        if validators is None:
+            validators = self.compute_conditional_validators(queryset)
+            cache.set(key, validators, self.conditional_timeout)
+        return validators
+
+    def conditional_scope(self):
+        user = ''
+        if self.conditional_per_user:
+            user = f"{self.request.user.pk}:{self.request.user.is_staff}"
+        return f"{self.request.get_full_path()}|{user}"
+
+    def compute_conditional_validators(self, queryset):
+        stats = queryset.order_by().aggregate(
+            last_modified=Max(self.conditional_field), count=Count('pk'))
+        last_modified = stats['last_modified']
+        raw = f"{self.conditional_scope()}|{last_modified}|{stats['count']}"
+        etag = quote_etag(md5(raw.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp
+
+    def conditional_response(self, request, queryset, build_response):
+        etag, last_modified = self.get_conditional_validators(queryset)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        response = build_response()
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(
+            request, queryset, lambda: self.list_response(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.get_queryset().filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            # a malformed id, as get_object() would answer it
+            raise Http404
+        return self.conditional_response(
+            request, queryset, lambda: self.retrieve_response(request, *args, **kwargs))
+
+    def list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def retrieve_response(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -1,3 +1,33 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an `Idempotency-Key` header"""
+    IN_PROGRESS = 'in_progress'
+    COMPLETE = 'complete'
+    STATE_CHOICES = [
+        (IN_PROGRESS, 'In progress'),
+        (COMPLETE, 'Complete'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    state = models.CharField(
+        max_length=20, choices=STATE_CHOICES, default=IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # while in progress: the request holding the key owns it until then
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'scope', 'key'], name='uniq_idempotency_key')
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.state})"
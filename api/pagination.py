@@ -0,0 +1,78 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination: every page is a `WHERE key < last_key LIMIT n`
+    query, so deep pages cost the same as the first one and no COUNT(*) is run.
+    """
+    ordering = '-id'
+
+
+class DefaultPagination(PageNumberPagination):
+    """
+    Page number pagination by default, with an opt-in keyset mode.
+     - `?pagination=cursor` starts a keyset listing
+     - `?cursor=<token>` continues one (the `next`/`previous` links carry it)
+    Views pick the keyset ordering through a `cursor_ordering` attribute.
+    Keyset pages are always ordered by that key, so keyset mode is refused
+    (400) together with a search (ranked results) or an `?ordering=`, which
+    the keyset would silently override.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def reordering_params(self, request, view):
+        """Query parameters of the view's filters that change the ordering"""
+        params = []
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, SearchFilter) and backend().get_search_terms(request):
+                params.append(backend.search_param)
+            elif issubclass(backend, OrderingFilter) and request.query_params.get(backend.ordering_param):
+                params.append(backend.ordering_param)
+        return params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_cursor(request):
+            conflicts = self.reordering_params(request, view)
+            if conflicts:
+                raise ValidationError({
+                    param: "Not supported with keyset pagination (?pagination=cursor)."
+                    for param in conflicts})
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = getattr(
+                view, 'cursor_ordering', KeysetPagination.ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" to use keyset pagination.',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+        ]
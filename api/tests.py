@@ -1,3 +1,298 @@
-from django.test import TestCase
+from datetime import timedelta
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings as django_settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from api import idempotency
+from api.authentication import user_cache_key
+from api.models import IdempotencyKey
+from home_care_hub.schema import SCHEMA_STATIC_PATH, build_schema
+from order.models import Cart, Order
+from order.services import OrderService
+from users.models import User
 
-# Create your tests here.
+
+class ConditionalGetTests(TestCase):
+    url = '/api/v1/orders/'
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.customer = User.objects.create_user(email='customer@example.com', password='x')
+        self.order = Order.objects.create(user=self.customer, total_price=Decimal('10.00'))
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def get(self, user, **headers):
+        self.client.force_authenticate(user)
+        return self.client.get(self.url, **headers)
+
+    def test_not_modified_runs_no_query_once_cached(self):
+        etag = self.get(self.staff)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(self.staff, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+    def test_malformed_id_is_not_found(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(f'{self.url}not-a-uuid/').status_code, 404)
+
+    def test_etag_is_per_user(self):
+        self.assertNotEqual(self.get(self.staff)['ETag'], self.get(self.customer)['ETag'])
+
+    def test_etag_changes_after_status_update(self):
+        etag = self.get(self.customer)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderService.bulk_update_status([self.order.pk], Order.PENDING)
+        response = self.get(self.customer, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['status'], Order.PENDING)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='buyer@example.com')
+        self.handler = mock.Mock(return_value=Response({'id': 1}, status=201))
+
+    def run_request(self, key='key-1', data=None):
+        request = Request(
+            APIRequestFactory().post('/api/v1/orders/', data or {'cart_id': 'c'}, format='json',
+                                     HTTP_IDEMPOTENCY_KEY=key),
+            parsers=[JSONParser()])
+        request.user = self.user
+        return idempotency.run(request, 'orders.create', self.handler)
+
+    def in_progress(self, lease_expires_at):
+        return IdempotencyKey.objects.create(
+            user=self.user, scope='orders.create', key='key-1',
+            request_hash=idempotency._request_hash(Request(
+                APIRequestFactory().post('/api/v1/orders/', {'cart_id': 'c'}, format='json'),
+                parsers=[JSONParser()])),
+            lease_expires_at=lease_expires_at,
+            expires_at=timezone.now() + timedelta(days=1))
+
+    def test_retry_replays_first_response(self):
+        self.assertEqual(self.run_request().status_code, 201)
+        retry = self.run_request()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.handler.assert_called_once()
+        self.assertEqual(self.run_request(data={'cart_id': 'other'}).status_code, 422)
+
+    def test_expired_lease_is_taken_over(self):
+        # left behind by a worker that was killed mid-request
+        self.in_progress(timezone.now() - timedelta(seconds=1))
+        response = self.run_request()
+        self.assertEqual(response.status_code, 201)
+        self.handler.assert_called_once()
+        self.assertEqual(IdempotencyKey.objects.get().state, IdempotencyKey.COMPLETE)
+
+    @mock.patch.object(idempotency, 'WAIT_TIMEOUT', 0.5)
+    def test_live_lease_is_waited_on_without_polling_the_database(self):
+        self.in_progress(timezone.now() + timedelta(minutes=1))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.run_request()
+        self.assertEqual(response.status_code, 409)
+        self.handler.assert_not_called()
+        # claim attempts only (expired row cleanup, insert, read), not one per poll
+        self.assertLessEqual(len(queries), 10)
+
+    def test_failed_request_releases_the_key(self):
+        self.handler.return_value = Response({'detail': 'gateway down'}, status=502)
+        self.assertEqual(self.run_request().status_code, 502)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.handler.return_value = Response({'id': 1}, status=201)
+        self.assertEqual(self.run_request().status_code, 201)
+
+
+class CachedUserTests(TestCase):
+    url = '/api/v1/orders/export/'   # staff only
+
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location.name,
+        }})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+
+    def get(self):
+        response = self.client.get(self.url)
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        return response
+
+    def save_user(self, **fields):
+        for name, value in fields.items():
+            setattr(self.user, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        table = f'FROM {connection.ops.quote_name(User._meta.db_table)}'
+        return [query['sql'] for query in queries if table in query['sql']]
+
+    def test_user_is_cached_without_password_hash(self):
+        self.assertTrue(self.user_queries())
+        self.assertEqual(self.user_queries(), [])
+        snapshot = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn(self.user.password, str(snapshot))
+
+    def test_deactivation_is_picked_up(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.save_user(is_active=False)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_staff_demotion_is_picked_up(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.save_user(is_staff=False)
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_profile_fields_load_in_one_query(self):
+        self.get()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/auth/users/me/')
+        self.assertEqual(response.data['email'], 'staff@example.com')
+
+    def test_cached_user_saves_a_query_per_request(self):
+        cart = Cart.objects.create(user=self.user)
+        url = f'/api/v1/carts/{cart.pk}/summary/'
+        self.client.get(url)
+        # the cart aggregate only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            # the user row, then the cart aggregate
+            with self.assertNumQueries(2):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_not_used(self):
+        self.get()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+
+# run in a fresh interpreter: other tests may already have imported drf_yasg
+LAZY_SCHEMA_SCRIPT = """
+import json, sys, django
+from django.conf import settings
+settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+django.setup()
+from django.core.management import call_command
+call_command('migrate', verbosity=0)
+import home_care_hub.urls
+schema_modules = ('drf_yasg.views', 'drf_yasg.generators', 'drf_yasg.inspectors')
+loaded = {name: name in sys.modules for name in schema_modules}
+from django.db import connection
+from django.test import Client
+from product.models import Product
+Product.objects.bulk_create([Product(name=f'Product {i}', description='', price=i) for i in range(3)])
+client = Client(HTTP_HOST='127.0.0.1')
+queries = []
+with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+    api_status = client.get('/api/v1/products/').status_code
+after_api = any(name in sys.modules for name in schema_modules)
+status = client.get('/swagger/').status_code
+print(json.dumps({'at_import': loaded, 'api_status': api_status,
+                  'api_queries': len(queries), 'after_api': after_api,
+                  'status': status, 'after_request': 'drf_yasg.views' in sys.modules}))
+"""
+
+
+class LazySchemaTests(TestCase):
+    def test_urlconf_does_not_import_schema_generation(self):
+        result = subprocess.run(
+            [sys.executable, '-c', LAZY_SCHEMA_SCRIPT], env=os.environ.copy(),
+            cwd=django_settings.BASE_DIR, capture_output=True, text=True, check=True)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(report['at_import'], {
+            'drf_yasg.views': False, 'drf_yasg.generators': False, 'drf_yasg.inspectors': False})
+        # the first API request of a cold start leaves schema generation unloaded
+        self.assertEqual(report['api_status'], 200)
+        self.assertFalse(report['after_api'])
+        # conditional GET validators, page count, the page, its images
+        self.assertEqual(report['api_queries'], 4)
+        self.assertEqual(report['status'], 200)
+        self.assertTrue(report['after_request'])
+
+
+class SchemaArtifactTests(TestCase):
+    def test_served_schema_matches_the_code(self):
+        # run generate_openapi_schema and collectstatic when this fails
+        fresh = json.loads(build_schema())
+        response = APIClient(HTTP_HOST='127.0.0.1').get('/swagger.json', follow=True)
+        self.assertEqual(response.status_code, 200)
+        content = (b''.join(response.streaming_content)
+                   if response.streaming else response.content)
+        self.assertEqual(json.loads(content), fresh)
+        with open(finders.find(SCHEMA_STATIC_PATH), 'rb') as artifact:
+            self.assertEqual(json.load(artifact), fresh)
+
+    def test_schema_is_independent_of_environment(self):
+        schema = json.loads(build_schema())
+        self.assertNotIn('host', schema)
+        self.assertNotIn('schemes', schema)
+        self.assertNotIn('9223372036854775807', json.dumps(schema))
+
+
+class WebOnlyMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_HOST='127.0.0.1', enforce_csrf_checks=True)
+        self.staff = User.objects.create_user(
+            email='admin@example.com', password='secret', is_staff=True, is_superuser=True)
+
+    def test_api_skips_session_csrf_and_messages(self):
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(response.status_code, 200)
+        request = response.wsgi_request
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertFalse(hasattr(request, '_messages'))
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertEqual(response.cookies, {})
+
+        # no CSRF token needed: wrong credentials, not a CSRF failure
+        response = self.client.post('/api/v1/auth/jwt/create/',
+                                    {'email': 'admin@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_admin_keeps_session_csrf_and_messages(self):
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+        self.assertTrue(hasattr(response.wsgi_request, '_messages'))
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        token = response.cookies['csrftoken'].value
+
+        credentials = {'username': 'admin@example.com', 'password': 'secret'}
+        self.assertEqual(self.client.post('/admin/login/', credentials).status_code, 403)
+        response = self.client.post('/admin/login/', dict(credentials, csrfmiddlewaretoken=token))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('sessionid', response.cookies)
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
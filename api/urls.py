@@ -2,6 +2,7 @@ from django.urls import path, include
 from product.views import ProductViewSet, ReviewViewSet, ProductImageViewSet
 from order.views import CartViewSet, CartItemViewSet, OrderViewset, initiate_payment, payment_cancel, payment_fail, payment_success
 from users.views import UserViewSet
+from reports.views import sales_report
 from rest_framework_nested import routers
 
 router = routers.DefaultRouter()
@@ -33,4 +34,5 @@ urlpatterns = [
     path("payment/success/", payment_success, name="payment-success"),
     path("payment/fail/", payment_fail, name="payment-fail"),
     path("payment/cancel/", payment_cancel, name="payment-cancel"),
+    path("reports/sales/", sales_report, name="sales-report"),
 ]
\ No newline at end of file
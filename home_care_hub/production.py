@@ -0,0 +1,33 @@
+"""
+Production settings: `DJANGO_SETTINGS_MODULE=home_care_hub.production`.
+
+Same as the development settings, except that DEBUG is off (Django stops
+recording every executed query), SECRET_KEY comes from the environment, the
+debug toolbar is not installed, the API only renders JSON and database
+connections are reused.
+"""
+from home_care_hub.settings import *  # noqa: F401,F403
+from home_care_hub.settings import DATABASES, INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, config
+
+DEBUG = False
+
+SECRET_KEY = config('SECRET_KEY')
+
+# development-only apps stay out of the app registry
+INSTALLED_APPS = [app for app in INSTALLED_APPS
+                  if app not in ('debug_toolbar', 'whitenoise.runserver_nostatic')]
+
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE
+              if not middleware.startswith('debug_toolbar.')]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+# keep database connections between requests instead of reconnecting each time
+DATABASES = {
+    **DATABASES,
+    'default': {**DATABASES['default'],
+                'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int)},
+}
@@ -0,0 +1,124 @@
+"""
+OpenAPI schema and the Swagger/ReDoc views.
+
+The schema is generated at build time by `generate_openapi_schema` into
+`api/static/api/openapi.json`; once collected, WhiteNoise serves it and the
+UIs load it from there. Without the artifact the schema is built once per
+process and memoized, so drf_yasg never introspects the API per request.
+drf_yasg's views, generators and inspectors are only imported on first use,
+not on every cold start.
+
+The schema names no host, so "Try it out" goes to the host serving the docs,
+and leaves out the integer limits the database backend puts on model fields;
+the artifact is the same whichever environment and database generated it.
+"""
+from functools import lru_cache
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from rest_framework import permissions
+
+SCHEMA_STATIC_PATH = 'api/openapi.json'
+# `?format=` values of drf_yasg's JSON spec renderers
+SPEC_FORMATS = {'openapi', 'json', '.json'}
+
+
+# integer field limits of the backends (e.g. 2147483647 on PostgreSQL,
+# 9223372036854775807 on SQLite), which drf_yasg reports as minimum/maximum
+STORAGE_BOUNDS = {
+    bound
+    for bounds in BaseDatabaseOperations.integer_field_ranges.values()
+    for bound in bounds
+    if bound
+} | {-2 ** 63, 2 ** 63 - 1}
+
+
+@lru_cache(maxsize=None)
+def api_info():
+    from drf_yasg import openapi
+    return openapi.Info(
+        title="Home Care Hub API",
+        default_version='v1',
+        description="API Documentation for Home Care Hub Project",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@homecarehub.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def schema_view():
+    from drf_yasg.views import get_schema_view
+    return get_schema_view(
+        api_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def strip_storage_bounds(node):
+    """Drop the integer minimum/maximum that only come from the database backend"""
+    if isinstance(node, dict):
+        if node.get('type') == 'integer':
+            for key in ('minimum', 'maximum'):
+                if node.get(key) in STORAGE_BOUNDS:
+                    del node[key]
+        for value in node.values():
+            strip_storage_bounds(value)
+    elif isinstance(node, list):
+        for value in node:
+            strip_storage_bounds(value)
+
+
+def build_schema(url=None):
+    """
+    The schema of the current code as JSON bytes (slow: introspects every
+    view). Without `url` it names no host.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    generator = schema_view().generator_class(api_info(), url=url)
+    schema = generator.get_schema(request=None, public=True)
+    strip_storage_bounds(schema)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema)
+
+
+@lru_cache(maxsize=None)
+def schema_document():
+    """The generated artifact if there is one, else the schema built once"""
+    path = finders.find(SCHEMA_STATIC_PATH)
+    if path:
+        with open(path, 'rb') as artifact:
+            return artifact.read()
+    return build_schema()
+
+
+@lru_cache(maxsize=None)
+def collected_schema_url():
+    """URL of the artifact when `collectstatic` has put it where WhiteNoise serves it"""
+    if staticfiles_storage.exists(SCHEMA_STATIC_PATH):
+        return staticfiles_storage.url(SCHEMA_STATIC_PATH)
+    return None
+
+
+def schema_json(request):
+    """The spec loaded by Swagger UI and ReDoc (SWAGGER/REDOC_SETTINGS['SPEC_URL'])"""
+    url = collected_schema_url()
+    if url:
+        return redirect(url)
+    return HttpResponse(schema_document(), content_type='application/json')
+
+
+def ui_view(renderer):
+    """A view serving the `renderer` ('swagger' or 'redoc') UI, built on first use"""
+    @lru_cache(maxsize=None)
+    def build():
+        return schema_view().with_ui(renderer, cache_timeout=0)
+
+    def view(request, *args, **kwargs):
+        if request.GET.get('format') in SPEC_FORMATS:
+            return schema_json(request)
+        return build()(request, *args, **kwargs)
+    view.csrf_exempt = True
+    return view
@@ -42,22 +42,32 @@ INSTALLED_APPS = [
     'order',
     'product',
     'users',
+    'reports',
     'debug_toolbar',
 ]
 
+# Session, CSRF, auth, messages and clickjacking middleware are skipped for
+# the JWT-only API under API_PATH_PREFIXES (see api/middleware.py); the admin
+# and the schema pages keep them.
+API_PATH_PREFIXES = ['/api/']
+
 MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'api.middleware.WebOnlySessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.WebOnlyCsrfViewMiddleware',
+    'api.middleware.WebOnlyAuthenticationMiddleware',
+    'api.middleware.WebOnlyMessageMiddleware',
+    'api.middleware.WebOnlyXFrameOptionsMiddleware',
 ]
 
+DEBUG_TOOLBAR_CONFIG = {
+    'SHOW_TOOLBAR_CALLBACK': 'api.middleware.show_toolbar',
+}
+
 ROOT_URLCONF = 'home_care_hub.urls'
 
 TEMPLATES = [
@@ -97,6 +107,33 @@ DATABASES = {
     }
 }
 
+# Cache (catalog responses, counters). Local memory unless a shared backend
+# such as django.core.cache.backends.redis.RedisCache is configured.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='home-care-hub'),
+    }
+}
+
+# Cart storage: 'database' (default) or 'cache' for the cache-backed cart store
+# with write-behind to the order tables (see order/cart_store.py). Dirty carts
+# are flushed on write once they are CART_FLUSH_INTERVAL seconds old, by the
+# flush_carts command, and always at checkout. 'cache' needs a cache backend
+# shared by all workers (not LocMemCache), which the system checks enforce.
+
+CART_STORE = config('CART_STORE', default='database')
+CART_FLUSH_INTERVAL = config('CART_FLUSH_INTERVAL', default=60, cast=int)
+
+# Idempotency-Key records (order creation, payment initiation) are kept this
+# many seconds; purge_idempotency_keys deletes expired ones. A request holds
+# its key for at most IDEMPOTENCY_LEASE_TIMEOUT seconds: if it dies or hangs,
+# a retry with the same key takes over once the lease has run out.
+
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)
+IDEMPOTENCY_LEASE_TIMEOUT = config('IDEMPOTENCY_LEASE_TIMEOUT', default=30, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -149,15 +186,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.DefaultPagination",
     "PAGE_SIZE": 10,
 }
 
+# seconds an authenticated user is served from the cache (see api/authentication.py).
+# Opt-in: only with a shared CACHE_BACKEND (Redis, Memcached, database, file),
+# where a user change reaches every worker; with the default local-memory
+# cache every request loads the user from the database as before
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=4),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -183,7 +226,13 @@ SWAGGER_SETTINGS = {
             'in': 'header',
             'description': 'Enter your JWT token in the format: `JWT <your_token>`'
         }
-    }
+    },
+    # pre-generated / memoized schema, see home_care_hub/schema.py
+    'SPEC_URL': 'schema-json',
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': 'schema-json',
 }
 
 CORS_ALLOWED_ORIGINS = [
@@ -201,5 +250,19 @@ cloudinary.config(
 SSLCOMMERZ = {
     'store_id': config('store_id'),
     'store_pass': config('store_pass'),
-    'is_sandbox': True
-}
\ No newline at end of file
+    'is_sandbox': True,
+    # seconds; a slow gateway must not hold a worker indefinitely
+    'connect_timeout': config('SSLCOMMERZ_CONNECT_TIMEOUT', default=3, cast=float),
+    'read_timeout': config('SSLCOMMERZ_READ_TIMEOUT', default=10, cast=float),
+    'pool_size': config('SSLCOMMERZ_POOL_SIZE', default=10, cast=int),
+    # simulated latency of order.payments.LocalGateway
+    'local_delay': config('SSLCOMMERZ_LOCAL_DELAY', default=0, cast=float),
+}
+
+# order.payments.LocalGateway answers locally, for development and load tests
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='order.payments.SSLCommerzGateway')
+
+# process payment callbacks inside the callback request. Nothing else drains
+# the event log in the serverless deployment; turn off only where a
+# `process_payment_events --loop` worker runs
+PAYMENT_EVENTS_INLINE = config('PAYMENT_EVENTS_INLINE', default=True, cast=bool)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from order.models import Cart, CartItem, Order, OrderItem
+from order.models import Cart, CartItem, Order, OrderItem, PaymentEvent
 
 # Register your models here.
 
@@ -14,5 +14,12 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'status']
 
 
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'tran_id', 'gateway_status', 'received_at', 'outcome']
+    list_filter = ['kind', 'outcome']
+    search_fields = ['tran_id', 'val_id']
+
+
 admin.site.register(CartItem)
 admin.site.register(OrderItem)
\ No newline at end of file
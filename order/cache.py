@@ -0,0 +1,26 @@
+"""
+Version of the order data, for cache entries derived from it (the ETag /
+Last-Modified validators of the order endpoints). It is bumped after every
+committed order write: saves and deletes through order/signals.py, and the
+raw status UPDATE in OrderService.bulk_update_status.
+"""
+import time
+from django.core.cache import cache
+
+VERSION_KEY = 'orders:version'
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from a timestamp so an evicted version never reuses old keys
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,260 @@
+"""
+Optional cache-backed cart storage (`CART_STORE = 'cache'`).
+
+Cart state lives in Django's cache under `cart:<id>`:
+    {'user_id': 7, 'items': {product_id: {'id': cart_item_id, 'quantity': 2}}}
+Reads and quantity changes/removals only touch the cache and mark the cart
+dirty. The marker is per cart: `cart:<id>:dirty` in the cache holds the time
+of the first unflushed change, and the first change after a flush also sets
+`Cart.dirty_since` so `flush_carts` can find the dirty carts with an indexed
+query. No write ever takes a lock shared by other carts. The `order` tables
+are brought up to date (write-behind) by `flush()`, which runs
+ - from `flush_carts` (periodically, e.g. cron),
+ - on the next write to a cart that has been dirty for CART_FLUSH_INTERVAL,
+ - inside the order transaction in `OrderService.create_order`.
+New lines are written through immediately so every line has a stable
+CartItem id for the item endpoints.
+
+The cache must be shared by every worker process (the `order.E001` system
+check rejects process-local backends such as LocMemCache) and must not evict
+keys on its own (e.g. Redis with `maxmemory-policy noeviction`), otherwise
+unflushed changes can be lost.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from order.models import Cart, CartItem
+from product import cache as catalog_cache
+from product.models import Product
+
+STATE_TIMEOUT = None
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.01
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The cart is being updated, please retry.'
+    default_code = 'cart_busy'
+
+
+def enabled():
+    return getattr(settings, 'CART_STORE', 'database') == 'cache'
+
+
+def _state_key(cart_id):
+    return f"cart:{cart_id}"
+
+
+@contextmanager
+def _lock(key):
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise CartBusy()
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+def locked(cart_id):
+    """Serialize every read-modify-write of one cart"""
+    return _lock(_state_key(cart_id))
+
+
+def _load(cart_id):
+    state = cache.get(_state_key(cart_id))
+    if state is not None:
+        return state
+    user_id = Cart.objects.filter(pk=cart_id).values_list('user_id', flat=True).first()
+    if user_id is None:
+        raise Http404('No Cart matches the given query.')
+    state = {
+        'user_id': user_id,
+        'items': {
+            product_id: {'id': pk, 'quantity': quantity}
+            for pk, product_id, quantity in
+            CartItem.objects.filter(cart_id=cart_id)
+            .values_list('id', 'product_id', 'quantity')
+        },
+    }
+    cache.set(_state_key(cart_id), state, STATE_TIMEOUT)
+    return state
+
+
+def _owned(cart_id, user):
+    state = _load(cart_id)
+    if state['user_id'] != user.pk:
+        raise Http404('No Cart matches the given query.')
+    return state
+
+
+def _dirty_key(cart_id):
+    return f"cart:{cart_id}:dirty"
+
+
+def _mark_dirty(cart_id):
+    # only the first change since the last flush reaches the database
+    if cache.add(_dirty_key(cart_id), time.time(), STATE_TIMEOUT):
+        Cart.objects.filter(pk=cart_id, dirty_since__isnull=True).update(
+            dirty_since=timezone.now())
+
+
+def _mark_clean(cart_id):
+    Cart.objects.filter(pk=cart_id, dirty_since__isnull=False).update(dirty_since=None)
+    # after commit, so a rolled back flush leaves the cart dirty
+    transaction.on_commit(lambda: cache.delete(_dirty_key(cart_id)))
+
+
+def _dirty_since(cart_id):
+    return cache.get(_dirty_key(cart_id))
+
+
+def _save(cart_id, state, dirty=True):
+    cache.set(_state_key(cart_id), state, STATE_TIMEOUT)
+    if not dirty:
+        return
+    since = _dirty_since(cart_id)
+    interval = getattr(settings, 'CART_FLUSH_INTERVAL', 60)
+    if since is not None and time.time() - since >= interval:
+        _flush(cart_id, state)
+    else:
+        _mark_dirty(cart_id)
+
+
+def add_items(cart_id, user, lines):
+    """Add `(product_id, quantity)` lines to a cart owned by `user`"""
+    with locked(cart_id):
+        state = _owned(cart_id, user)
+        new = {}
+        changed = False
+        for product_id, quantity in lines:
+            if product_id in state['items']:
+                state['items'][product_id]['quantity'] += quantity
+                changed = True
+            else:
+                new[product_id] = new.get(product_id, 0) + quantity
+
+        if new:
+            # write-through with absolute quantities: the cache is authoritative
+            created = CartItem.objects.bulk_create(
+                [CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                 for product_id, quantity in new.items()],
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+            for item in created:
+                state['items'][item.product_id] = {
+                    'id': item.pk, 'quantity': item.quantity}
+
+        _save(cart_id, state, dirty=changed)
+
+
+def items(cart_id, user, product_ids=None):
+    """
+    Unsaved CartItem instances (with `product` set) of a cart owned by
+    `user`, optionally limited to `product_ids`. Needs no database access
+    when the cart and products are cached.
+    """
+    lines = [(line['id'], product_id, line['quantity'])
+             for product_id, line in _owned(cart_id, user)['items'].items()
+             if product_ids is None or product_id in product_ids]
+    products = product_info([product_id for _, product_id, _ in lines])
+    return [
+        CartItem(id=pk, cart_id=cart_id, quantity=quantity,
+                 product=Product(**products[product_id]))
+        for pk, product_id, quantity in sorted(lines)
+        if product_id in products
+    ]
+
+
+def _find(state, item_id):
+    for product_id, line in state['items'].items():
+        if str(line['id']) == str(item_id):
+            return product_id
+    raise Http404('No CartItem matches the given query.')
+
+
+def set_quantity(cart_id, user, item_id, quantity):
+    with locked(cart_id):
+        state = _owned(cart_id, user)
+        product_id = _find(state, item_id)
+        state['items'][product_id]['quantity'] = quantity
+        _save(cart_id, state)
+        return product_id
+
+
+def remove(cart_id, user, item_id):
+    with locked(cart_id):
+        state = _owned(cart_id, user)
+        state['items'].pop(_find(state, item_id))
+        _save(cart_id, state)
+
+
+def _flush(cart_id, state):
+    """Make the cart's rows match `state`. Caller holds the cart lock."""
+    with transaction.atomic():
+        # products deleted since they were added are gone from the database
+        live = set(Product.objects.filter(
+            id__in=list(state['items'])).values_list('id', flat=True))
+        CartItem.objects.filter(cart_id=cart_id).exclude(product_id__in=live).delete()
+        CartItem.objects.bulk_create(
+            [CartItem(cart_id=cart_id, product_id=product_id, quantity=line['quantity'])
+             for product_id, line in state['items'].items() if product_id in live],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+        _mark_clean(cart_id)
+
+
+def flush(cart_id):
+    """
+    Write the cached state of a cart to the database. Must be called with the
+    cart lock held; inside a transaction the writes join it.
+    """
+    state = cache.get(_state_key(cart_id))
+    if state is not None and _dirty_since(cart_id) is not None:
+        _flush(cart_id, state)
+
+
+def flush_dirty(min_age=0):
+    """Flush every cart dirty for at least `min_age` seconds"""
+    cart_ids = list(
+        Cart.objects
+        .filter(dirty_since__lte=timezone.now() - timedelta(seconds=min_age))
+        .values_list('pk', flat=True))
+    for cart_id in cart_ids:
+        with locked(cart_id):
+            state = cache.get(_state_key(cart_id))
+            if state is None:
+                # nothing cached is left to write
+                _mark_clean(cart_id)
+            else:
+                _flush(cart_id, state)
+    return len(cart_ids)
+
+
+def forget(cart_id):
+    """Drop the cached state so the next read reloads it from the database"""
+    cache.delete(_state_key(cart_id))
+    _mark_clean(cart_id)
+
+
+def product_info(product_ids):
+    """`{id: {'id', 'name', 'price'}}`, served from the catalog cache"""
+    def build(missing):
+        return {row['id']: row for row in
+                Product.objects.filter(id__in=missing).values('id', 'name', 'price')}
+    return catalog_cache.get_many('cart-product', product_ids, build)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from api import caches
+
+
+@register(Tags.caches)
+def check_cart_store_cache(app_configs, **kwargs):
+    if getattr(settings, 'CART_STORE', 'database') != 'cache' or caches.is_shared():
+        return []
+    return [Error(
+        "CART_STORE = 'cache' needs a cache shared by all worker processes.",
+        hint="Configure a shared backend such as RedisCache (CACHE_BACKEND), "
+             "or keep CART_STORE = 'database'.",
+        id='order.E001',
+    )]
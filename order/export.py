@@ -0,0 +1,110 @@
+"""
+Order export for accounting, shared by the `orders/export/` endpoint and the
+`export_orders` command. Rows are produced lazily: orders come from a
+server-side cursor (`.iterator()`) and their items are fetched per chunk with
+one `order_id__in` query, so memory is bounded by the chunk size, not by the
+number of orders exported.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from order.models import Order, OrderItem
+
+CSV_FIELDS = [
+    'order_id', 'created_at', 'user_email', 'status', 'order_total',
+    'product_id', 'product_name', 'quantity', 'price', 'line_total',
+]
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def orders(start=None, end=None, statuses=None):
+    """Orders placed between the `start` and `end` days (inclusive)"""
+    tz = timezone.get_current_timezone()
+    queryset = Order.objects.all()
+    if start:
+        queryset = queryset.filter(created_at__gte=datetime.combine(start, time.min, tzinfo=tz))
+    if end:
+        queryset = queryset.filter(
+            created_at__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz))
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def iter_orders(queryset, chunk_size=2000):
+    """Order dicts with their `items`, oldest first"""
+    rows = (
+        queryset
+        .order_by('created_at', 'id')
+        .values_list('id', 'created_at', 'user__email', 'status', 'total_price')
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _render_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _render_chunk(chunk)
+
+
+def _render_chunk(chunk):
+    items = {}
+    for order_id, product_id, name, quantity, price, total in (
+            OrderItem.objects
+            .filter(order_id__in=[row[0] for row in chunk])
+            .order_by('id')
+            .values_list('order_id', 'product_id', 'product__name',
+                         'quantity', 'price', 'total_price')):
+        items.setdefault(order_id, []).append({
+            'product_id': product_id,
+            'product_name': name,
+            'quantity': quantity,
+            'price': str(price),
+            'line_total': str(total),
+        })
+    for order_id, created_at, email, status, total in chunk:
+        yield {
+            'id': str(order_id),
+            'created_at': created_at.isoformat(),
+            'user_email': email,
+            'status': status,
+            'total_price': str(total),
+            'items': items.get(order_id, []),
+        }
+
+
+class _Echo:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders):
+    """CSV text, one row per order item (orders without items get one row)"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for order in orders:
+        head = [order['id'], order['created_at'], order['user_email'],
+                order['status'], order['total_price']]
+        if not order['items']:
+            yield writer.writerow(head + [''] * 5)
+        for item in order['items']:
+            yield writer.writerow(head + [
+                item['product_id'], item['product_name'], item['quantity'],
+                item['price'], item['line_total']])
+
+
+def jsonl_lines(orders):
+    for order in orders:
+        yield json.dumps(order) + '\n'
+
+
+def lines(fmt, orders):
+    return csv_lines(orders) if fmt == 'csv' else jsonl_lines(orders)
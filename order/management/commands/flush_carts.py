@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from order import cart_store
+
+
+class Command(BaseCommand):
+    help = "Write pending changes of cache-backed carts to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=0,
+                            help="Only flush carts dirty for at least this many seconds")
+
+    def handle(self, *args, **options):
+        if not cart_store.enabled():
+            self.stdout.write("CART_STORE is not 'cache', nothing to flush")
+            return
+        flushed = cart_store.flush_dirty(min_age=options['min_age'])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts"))
@@ -0,0 +1,57 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from order.models import Order
+from order.payments import LocalGateway
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test: post a burst of signed success callbacks (with duplicate "
+        "deliveries) for unpaid orders to the payment success endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Success callback URL "
+                            "(default: BACKEND_URL/api/v1/payment/success/)")
+        parser.add_argument('--orders', type=int, default=100,
+                            help="Number of unpaid orders to pay")
+        parser.add_argument('--duplicates', type=int, default=3,
+                            help="Deliveries of each callback")
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def handle(self, *args, **options):
+        url = options['url'] or f"{settings.BACKEND_URL.rstrip('/')}/api/v1/payment/success/"
+        orders = list(Order.objects.filter(status=Order.UNPAID)
+                      .values_list('pk', 'total_price')[:options['orders']])
+        if not orders:
+            raise CommandError("No unpaid orders to pay")
+
+        # signed with the configured store password, so the callbacks verify
+        gateway = LocalGateway(settings.SSLCOMMERZ)
+        callbacks = [gateway.callback_payload(f"order_{pk}", total) for pk, total in orders]
+        deliveries = callbacks * options['duplicates']
+        random.shuffle(deliveries)
+
+        http = requests.Session()
+        http.mount(url, requests.adapters.HTTPAdapter(pool_maxsize=options['concurrency']))
+
+        def post(payload):
+            try:
+                return http.post(url, data=payload, allow_redirects=False, timeout=30).status_code
+            except requests.RequestException as exc:
+                return type(exc).__name__
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = Counter(pool.map(post, deliveries))
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(', '.join(f"{code}: {count}" for code, count in results.most_common()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Posted {len(deliveries)} callbacks for {len(callbacks)} orders in "
+            f"{elapsed:.2f}s ({len(deliveries) / elapsed if elapsed else 0:.0f} req/s)"))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from order.services import PaymentEventService
+
+
+class Command(BaseCommand):
+    help = "Apply recorded payment callbacks to their orders, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for new events instead of exiting when drained")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to wait between polls when idle (with --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            counts = PaymentEventService.process_all(batch_size=options['batch_size'])
+            if counts:
+                self.stdout.write(self.format(counts))
+            if not options['loop']:
+                if not counts:
+                    self.stdout.write("No pending payment events")
+                return
+            if not counts:
+                time.sleep(options['interval'])
+
+    @staticmethod
+    def format(counts):
+        return ', '.join(f"{outcome}: {count}" for outcome, count in sorted(counts.items()))
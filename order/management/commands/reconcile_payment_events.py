@@ -0,0 +1,31 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from order.models import PaymentEvent
+from order.services import PaymentEventService
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay payment callbacks that were recorded but never processed "
+        "(e.g. the worker was down) and summarize the event log"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=300,
+                            help="Only replay events received at least this many seconds ago")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+        counts = PaymentEventService.process_all(
+            batch_size=options['batch_size'], received_before=cutoff)
+        replayed = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {replayed} events" +
+            (f" ({', '.join(f'{k}: {v}' for k, v in sorted(counts.items()))})" if counts else "")))
+
+        for row in (PaymentEvent.objects.values('outcome')
+                    .annotate(count=Count('pk')).order_by('outcome')):
+            self.stdout.write(f"{row['outcome'] or 'pending'}: {row['count']}")
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_order_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('success', 'Success'), ('fail', 'Fail'), ('cancel', 'Cancel')], max_length=10)),
+                ('tran_id', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('val_id', models.CharField(blank=True, max_length=100)),
+                ('order_id', models.UUIDField(blank=True, null=True)),
+                ('gateway_status', models.CharField(blank=True, max_length=30)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('payload', models.JSONField()),
+                ('dedupe_key', models.CharField(max_length=255, unique=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('outcome', models.CharField(blank=True, choices=[('applied', 'Applied'), ('ignored', 'Ignored'), ('invalid', 'Invalid'), ('recorded', 'Recorded')], max_length=10)),
+                ('detail', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='payment_event_pending_idx')],
+            },
+        ),
+    ]
@@ -12,6 +12,14 @@ class Cart(models.Model):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name="cart")
     created_at = models.DateTimeField(auto_now_add=True)
+    # set while the cache-backed cart store holds unflushed changes
+    dirty_since = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dirty_since'], name='cart_dirty_idx',
+                         condition=models.Q(dirty_since__isnull=False)),
+        ]
 
     def __str__(self):
         return f"Cart of {self.user.first_name}"
@@ -43,6 +51,13 @@ class Order(models.Model):
         (COMPLETE, 'Complete'),
         (CANCELED, 'Canceled')
     ]
+    # allowed status changes: current status -> statuses it may move to
+    TRANSITIONS = {
+        UNPAID: [PENDING, CANCELED],
+        PENDING: [COMPLETE, CANCELED],
+        COMPLETE: [],
+        CANCELED: [],
+    }
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="orders")
@@ -52,6 +67,20 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='order_created_at_idx'),
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ]
+
+    @classmethod
+    def statuses_leading_to(cls, status):
+        return [source for source, targets in cls.TRANSITIONS.items() if status in targets]
+
+    def can_transition_to(self, status):
+        return status in self.TRANSITIONS.get(self.status, [])
+
     def __str__(self):
         return f"Order {self.id} by {self.user.first_name} - {self.status}"
 
@@ -65,4 +94,48 @@ class OrderItem(models.Model):
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name}"
+
+class PaymentEvent(models.Model):
+    """A payment gateway callback, recorded as it arrived and processed later"""
+    SUCCESS = 'success'
+    FAIL = 'fail'
+    CANCEL = 'cancel'
+    KIND_CHOICES = [
+        (SUCCESS, 'Success'),
+        (FAIL, 'Fail'),
+        (CANCEL, 'Cancel'),
+    ]
+    APPLIED = 'applied'
+    IGNORED = 'ignored'
+    INVALID = 'invalid'
+    RECORDED = 'recorded'
+    OUTCOME_CHOICES = [
+        (APPLIED, 'Applied'),
+        (IGNORED, 'Ignored'),
+        (INVALID, 'Invalid'),
+        (RECORDED, 'Recorded'),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    tran_id = models.CharField(max_length=100, blank=True, db_index=True)
+    val_id = models.CharField(max_length=100, blank=True)
+    # not a foreign key: callbacks are recorded even for unknown orders
+    order_id = models.UUIDField(null=True, blank=True)
+    gateway_status = models.CharField(max_length=30, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    payload = models.JSONField()
+    # repeated deliveries of a callback collapse onto one row
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, blank=True)
+    detail = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True),
+                         name='payment_event_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.tran_id} ({self.outcome or 'pending'})"
@@ -0,0 +1,140 @@
+"""
+Payment gateway adapters.
+
+`get_gateway()` returns one process-wide gateway, built from
+`settings.SSLCOMMERZ` on first use and chosen by `settings.PAYMENT_GATEWAY`:
+ - `SSLCommerzGateway` talks to SSLCommerz over a pooled `requests.Session`
+   with explicit connect/read timeouts,
+ - `LocalGateway` answers locally (optionally after a delay), for tests,
+   development and load tests against a simulated slow gateway.
+Every gateway has a blocking `create_session` and an awaitable
+`acreate_session` for async views; the latter runs the blocking call in a
+worker thread so the event loop is never blocked on the gateway.
+Callbacks are checked with `verify_callback`, SSLCommerz's `verify_sign`
+scheme, which `LocalGateway.callback_payload` also uses to sign the
+callbacks it generates.
+"""
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+from uuid import uuid4
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not be reached or answered with something unusable"""
+
+
+def _signature(payload, keys, store_pass):
+    params = {key: payload.get(key, '') for key in keys}
+    params['store_passwd'] = hashlib.md5(store_pass.encode()).hexdigest()
+    message = '&'.join(f"{key}={params[key]}" for key in sorted(params))
+    return hashlib.md5(message.encode()).hexdigest()
+
+
+class BaseGateway:
+    def __init__(self, options):
+        self.options = options
+
+    def create_session(self, post_body):
+        raise NotImplementedError
+
+    def verify_callback(self, payload):
+        """Whether `verify_sign` matches the fields listed in `verify_key`"""
+        if not payload.get('verify_key') or not payload.get('verify_sign'):
+            return False
+        keys = payload['verify_key'].split(',')
+        if any(key not in payload for key in keys):
+            return False
+        return hmac.compare_digest(
+            _signature(payload, keys, self.options['store_pass']), payload['verify_sign'])
+
+    async def acreate_session(self, post_body):
+        return await sync_to_async(self.create_session, thread_sensitive=False)(post_body)
+
+
+class SSLCommerzGateway(BaseGateway):
+    def __init__(self, options):
+        super().__init__(options)
+        mode = 'sandbox' if options.get('is_sandbox', True) else 'securepay'
+        self.session_url = f"https://{mode}.sslcommerz.com/gwprocess/v4/api.php"
+        self.timeout = (options.get('connect_timeout', 3), options.get('read_timeout', 10))
+        self.http = requests.Session()
+        # connections to the gateway are kept alive and shared by all threads
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=options.get('pool_size', 10))
+        self.http.mount('https://', adapter)
+
+    def create_session(self, post_body):
+        body = dict(post_body, store_id=self.options['store_id'],
+                    store_passwd=self.options['store_pass'])
+        try:
+            response = self.http.post(self.session_url, data=body, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as exc:
+            raise PaymentGatewayError(str(exc)) from exc
+
+
+class LocalGateway(BaseGateway):
+    """Accepts every session; `local_delay` seconds simulate gateway latency"""
+
+    def create_session(self, post_body):
+        time.sleep(self.options.get('local_delay', 0))
+        session_key = uuid4().hex
+        return {
+            'status': 'SUCCESS',
+            'sessionkey': session_key,
+            'GatewayPageURL': f"https://gateway.local/pay/{session_key}?tran_id={post_body['tran_id']}",
+        }
+
+    def callback_payload(self, tran_id, amount, status='VALID'):
+        """A signed success callback, as SSLCommerz would post it"""
+        payload = {
+            'tran_id': tran_id,
+            'val_id': uuid4().hex,
+            'amount': str(amount),
+            'currency': 'BDT',
+            'status': status,
+        }
+        keys = list(payload)
+        payload['verify_key'] = ','.join(keys)
+        payload['verify_sign'] = _signature(payload, keys, self.options['store_pass'])
+        return payload
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    gateway_class = import_string(getattr(
+        settings, 'PAYMENT_GATEWAY', 'order.payments.SSLCommerzGateway'))
+    return gateway_class(settings.SSLCOMMERZ)
+
+
+def session_body(order, user, num_items):
+    """The SSLCommerz session request for an order, without store credentials"""
+    backend = settings.BACKEND_URL.rstrip('/')
+    return {
+        'total_amount': str(order.total_price),   # SSLCommerz likes string
+        'currency': "BDT",                        # use BDT for SSLCommerz
+        'success_url': f"{backend}/api/v1/payment/success/",
+        'fail_url':    f"{backend}/api/v1/payment/fail/",
+        'cancel_url':  f"{backend}/api/v1/payment/cancel/",
+        'emi_option': 0,
+        'cus_name':  (f"{user.first_name} {user.last_name}".strip() or user.email),
+        'cus_email': user.email,
+        'cus_phone': getattr(user, 'phone_number', '') or 'N/A',
+        'cus_add1':  getattr(user, 'address', '') or 'N/A',
+        'cus_city': "Dhaka",
+        'cus_country': "Bangladesh",
+        'shipping_method': "NO",
+        'multi_card_name': "",
+        'num_of_item': num_items,
+        'product_name': "E-commerce Products",
+        'product_category': "General",
+        'product_profile': "general",
+        'tran_id': f"order_{order.id}",
+    }
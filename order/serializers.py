@@ -1,10 +1,9 @@
-from django.db import transaction
-from django.db.models import F
 from rest_framework import serializers
 from order.models import Cart, CartItem, Order, OrderItem
 from product.models import Product
 from product.serializers import ProductSerializer
-from order.services import OrderService
+from order.services import CartService, OrderService
+from order import cart_store
 
 
 class EmptySerializer(serializers.Serializer):
@@ -31,26 +30,65 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         return value
 
     def save(self, **kwargs):
-        cart_id   = self.context['cart_id']
-        product_id= self.validated_data['product_id']
-        quantity  = self.validated_data['quantity']
-
-        print("Adding to cart:", cart_id, product_id, quantity)
-        with transaction.atomic():
-            try:
-                ci = (CartItem.objects
-                      .select_for_update()
-                      .get(cart_id=cart_id, product_id=product_id))
-                CartItem.objects.filter(pk=ci.pk).update(quantity=F('quantity') + quantity)
-                ci.refresh_from_db(fields=['quantity'])
-            except CartItem.DoesNotExist:
-                ci = CartItem.objects.create(
-                    cart_id=cart_id, product_id=product_id, quantity=quantity
-                )
-        self.instance = ci
+        cart_id = self.context['cart_id']
+        product_id = self.validated_data['product_id']
+        quantity = self.validated_data['quantity']
+
+        if cart_store.enabled():
+            user = self.context['request'].user
+            cart_store.add_items(cart_id, user, [(product_id, quantity)])
+            self.instance = cart_store.items(cart_id, user, {product_id})[0]
+            return self.instance
+
+        pk, total = CartService.add_items(cart_id, [(product_id, quantity)])[product_id]
+        self.instance = CartItem(
+            id=pk, cart_id=cart_id, product_id=product_id, quantity=total)
         return self.instance
 
 
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkAddCartItemSerializer(serializers.Serializer):
+    max_lines = 500
+    items = CartLineSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        if len(items) > self.max_lines:
+            raise serializers.ValidationError(
+                f"At most {self.max_lines} items can be added at once")
+        product_ids = {item['product_id'] for item in items}
+        found = set(Product.objects.filter(
+            pk__in=product_ids).values_list('pk', flat=True))
+        missing = sorted(product_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                f"Products with ids {missing} do not exist")
+        return items
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        lines = [(item['product_id'], item['quantity'])
+                 for item in self.validated_data['items']]
+        if cart_store.enabled():
+            user = self.context['request'].user
+            cart_store.add_items(cart_id, user, lines)
+            self.instance = cart_store.items(cart_id, user, {pid for pid, _ in lines})
+            return self.instance
+
+        CartService.add_items(cart_id, lines)
+        self.instance = list(
+            CartItem.objects
+            .select_related('product')
+            .filter(cart_id=cart_id, product_id__in={pid for pid, _ in lines}))
+        return self.instance
+
+    def to_representation(self, instance):
+        return {'items': CartItemSerializer(instance, many=True).data}
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
@@ -67,6 +105,9 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'total_price']
 
     def get_total_price(self, cart_item: CartItem):
+        line_total = getattr(cart_item, 'line_total', None)
+        if line_total is not None:
+            return line_total
         return cart_item.quantity * cart_item.product.price
 
 
@@ -81,10 +122,18 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['user']
 
     def get_total_price(self, cart: Cart):
+        items_total = getattr(cart, 'items_total', None)
+        if items_total is not None:
+            return items_total
         return sum(
             [item.product.price * item.quantity for item in cart.items.all()])
 
 
+class CartSummarySerializer(serializers.Serializer):
+    item_count = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
@@ -92,7 +141,8 @@ class CreateOrderSerializer(serializers.Serializer):
         if not Cart.objects.filter(pk=cart_id).exists():
             raise serializers.ValidationError('No cart found with this id')
 
-        if not CartItem.objects.filter(cart_id=cart_id).exists():
+        # with the cache cart store pending lines are checked after the flush
+        if not cart_store.enabled() and not CartItem.objects.filter(cart_id=cart_id).exists():
             raise serializers.ValidationError('Cart is empty')
 
         return cart_id
@@ -124,10 +174,53 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['status']
 
+    def validate_status(self, status):
+        if self.instance and status != self.instance.status \
+                and not self.instance.can_transition_to(status):
+            raise serializers.ValidationError(
+                f"Can not change an order from {self.instance.status} to {status}")
+        return status
+
+
+class OrderExportQuerySerializer(serializers.Serializer):
+    # not `format`, which DRF reserves for renderer selection
+    file_format = serializers.ChoiceField(choices=['csv', 'jsonl'], default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.CharField(required=False, help_text="Comma separated order statuses")
+
+    def validate_status(self, value):
+        valid = {choice for choice, _ in Order.STATUS_CHOICES}
+        statuses = [s.strip() for s in value.split(',') if s.strip()]
+        invalid = [s for s in statuses if s not in valid]
+        if invalid:
+            raise serializers.ValidationError(f"Unknown status: {', '.join(invalid)}")
+        return statuses
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({"end": "Must not be before start"})
+        return attrs
+
+
+class BulkUpdateOrderStatusSerializer(serializers.Serializer):
+    max_orders = 1000
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=max_orders)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
\ No newline at end of file
+        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
+
+
+class OrderListSerializer(serializers.ModelSerializer):
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'item_count']
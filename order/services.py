@@ -1,58 +1,388 @@
-from order.models import Cart, CartItem, OrderItem, Order
-from django.db import transaction
-from rest_framework.exceptions import PermissionDenied, ValidationError
-from decimal import Decimal
+from order.models import Cart, CartItem, OrderItem, Order, PaymentEvent
+from product.models import Product
+from reports.services import SalesRollupService
+from order import cache as order_cache, cart_store, payments
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import status as http_status
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+
+
+def line_total(prefix=''):
+    """`quantity * product.price` of a cart line, computed by the database"""
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def money(expression):
+    return Coalesce(expression, Value(Decimal('0')),
+                    output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+class OrderStatusConflict(APIException):
+    status_code = http_status.HTTP_409_CONFLICT
+    default_detail = 'The order status changed in the meantime.'
+    default_code = 'order_status_conflict'
+
+
+class CartService:
+    @staticmethod
+    def items_with_totals():
+        return CartItem.objects.select_related('product').annotate(line_total=line_total())
+
+    @staticmethod
+    def carts_with_totals():
+        items_total = (
+            CartItem.objects
+            .filter(cart=OuterRef('pk'))
+            .order_by()
+            .values('cart')
+            .annotate(total=Sum(line_total()))
+            .values('total')
+        )
+        return Cart.objects.annotate(items_total=money(Subquery(items_total)))
+
+    @staticmethod
+    def summary(cart_id, user):
+        """Item count and total of a cart in one aggregate query, or None"""
+        return (
+            Cart.objects
+            .filter(pk=cart_id, user=user)
+            .annotate(item_count=Coalesce(Sum('items__quantity'), 0),
+                      total_price=money(Sum(line_total('items__'))))
+            .values('item_count', 'total_price')
+            .first()
+        )
+
+    @staticmethod
+    def add_items(cart_id, lines):
+        """
+        Add `(product_id, quantity)` lines to a cart in a single
+        `INSERT ... ON CONFLICT (cart, product) DO UPDATE` statement, relying on
+        the `uniq_cart_product` constraint. Quantities are added to existing
+        lines atomically, so concurrent adds to the same cart never lose
+        updates. Returns `{product_id: (cart_item_id, quantity)}`.
+        """
+        merged = {}
+        for product_id, quantity in lines:
+            merged[product_id] = merged.get(product_id, 0) + quantity
+        if not merged:
+            return {}
+
+        qn = connection.ops.quote_name
+        table = qn(CartItem._meta.db_table)
+        cart = CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)
+        values = ', '.join(['(%s, %s, %s)'] * len(merged))
+        params = []
+        for product_id, quantity in merged.items():
+            params += [cart, product_id, quantity]
+
+        sql = (
+            f"INSERT INTO {table} ({qn('cart_id')}, {qn('product_id')}, {qn('quantity')}) "
+            f"VALUES {values} "
+            f"ON CONFLICT ({qn('cart_id')}, {qn('product_id')}) DO UPDATE "
+            f"SET {qn('quantity')} = {table}.{qn('quantity')} + EXCLUDED.{qn('quantity')} "
+            f"RETURNING {qn('id')}, {qn('product_id')}, {qn('quantity')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {product_id: (pk, quantity)
+                    for pk, product_id, quantity in cursor.fetchall()}
 
 
 class OrderService:
+    @staticmethod
+    def item_count():
+        """
+        Correlated line count of an order. With LIMIT it is only evaluated for
+        the rows of the page, unlike a JOIN + GROUP BY over every order.
+        """
+        lines = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return Coalesce(Subquery(lines, output_field=IntegerField()), 0)
+
     @staticmethod
     def create_order(user_id, cart_id):
+        if not cart_store.enabled():
+            return OrderService._create_order(user_id, cart_id)
+
+        # no cart writes between the flush and dropping the cached state
+        with cart_store.locked(cart_id):
+            order = OrderService._create_order(user_id, cart_id)
+            cart_store.forget(cart_id)
+            return order
+
+    @staticmethod
+    def _create_order(user_id, cart_id):
+        """
+        Set-based checkout: the cart lines are moved into OrderItem with one
+        INSERT ... SELECT joined to the current product prices and the order
+        total is summed by the database, so no cart line is loaded into Python
+        while the cart row is locked.
+        """
         with transaction.atomic():
-            cart = (
-                Cart.objects
-                .select_for_update()
-                .select_related('user')
-                .get(pk=cart_id, user_id=user_id)
-            )
-            cart_items = list(cart.items.select_related('product'))
-            
-            if not cart_items:
+            Cart.objects.select_for_update().only('pk').get(pk=cart_id, user_id=user_id)
+            if cart_store.enabled():
+                # write-behind changes join the order transaction
+                cart_store.flush(cart_id)
+
+            order = Order.objects.create(user_id=user_id, total_price=Decimal('0'))
+            if not OrderService._move_cart_lines(cart_id, order.pk):
                 raise ValidationError({"detail": "Cart is empty"})
+            order.total_price = OrderService._sum_order_total(order.pk)
+            SalesRollupService.add_orders([order.pk])
+            return order
 
-            total_price = sum((item.product.price * item.quantity for item in cart_items), Decimal('0'))
+    @staticmethod
+    def _move_cart_lines(cart_id, order_id):
+        """
+        Copy the cart lines into the order and clear them (the cart row itself
+        stays). On PostgreSQL a data-modifying CTE does both in one statement,
+        so only the deleted lines are ordered even if the cart changes
+        concurrently; elsewhere the transaction's write lock covers the gap.
+        Returns the number of lines moved.
+        """
+        qn = connection.ops.quote_name
+        cart_item = qn(CartItem._meta.db_table)
+        order_item = qn(OrderItem._meta.db_table)
+        product = qn(Product._meta.db_table)
+        cart = CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)
+        order = OrderItem._meta.get_field('order').get_db_prep_value(order_id, connection)
+        columns = ', '.join(qn(column) for column in (
+            'order_id', 'product_id', 'quantity', 'price', 'total_price'))
 
-            order = Order.objects.create(
-                user_id=user_id, total_price=total_price)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"WITH moved AS ("
+                    f"DELETE FROM {cart_item} WHERE {qn('cart_id')} = %s "
+                    f"RETURNING {qn('product_id')}, {qn('quantity')}) "
+                    f"INSERT INTO {order_item} ({columns}) "
+                    f"SELECT %s, moved.{qn('product_id')}, moved.{qn('quantity')}, p.{qn('price')}, "
+                    f"moved.{qn('quantity')} * p.{qn('price')} "
+                    f"FROM moved JOIN {product} p ON p.{qn('id')} = moved.{qn('product_id')}",
+                    [cart, order])
+                return cursor.rowcount
 
-            OrderItem.objects.bulk_create([
-                OrderItem(
-                    order=order,
-                    product=item.product,
-                    price=item.product.price,
-                    quantity=item.quantity,
-                    total_price=item.product.price * item.quantity
-                ) for item in cart_items
-            ])
-            
-            # clear cart items instead of deleting the cart row
-            CartItem.objects.filter(cart=cart).delete()
+            cursor.execute(
+                f"INSERT INTO {order_item} ({columns}) "
+                f"SELECT %s, ci.{qn('product_id')}, ci.{qn('quantity')}, p.{qn('price')}, "
+                f"ci.{qn('quantity')} * p.{qn('price')} "
+                f"FROM {cart_item} ci JOIN {product} p ON p.{qn('id')} = ci.{qn('product_id')} "
+                f"WHERE ci.{qn('cart_id')} = %s",
+                [order, cart])
+            moved = cursor.rowcount
+            cursor.execute(
+                f"DELETE FROM {cart_item} WHERE {qn('cart_id')} = %s", [cart])
+            return moved
 
-            return order
+    @staticmethod
+    def _sum_order_total(order_id):
+        qn = connection.ops.quote_name
+        order_table = qn(Order._meta.db_table)
+        order_item = qn(OrderItem._meta.db_table)
+        order = Order._meta.pk.get_db_prep_value(order_id, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {order_table} SET {qn('total_price')} = ("
+                f"SELECT COALESCE(SUM({qn('total_price')}), 0) FROM {order_item} "
+                f"WHERE {qn('order_id')} = %s) "
+                f"WHERE {qn('id')} = %s RETURNING {qn('total_price')}",
+                [order, order])
+            total = cursor.fetchone()[0]
+        return Order._meta.get_field('total_price').to_python(total)
 
     @staticmethod
-    def cancel_order(order, user):
-        if user.is_staff:
-            order.status = Order.CANCELED
-            order.save()
-            return order
+    def set_status(order, status):
+        """
+        Change the status of one order and move it in the sales rollups. The
+        transition is checked by the conditional UPDATE itself, so a request
+        that read the order before a concurrent change can't apply a move
+        the current status doesn't allow; it gets OrderStatusConflict (409).
+        """
+        updated, skipped = OrderService.bulk_update_status([order.pk], status)
+        if not updated:
+            raise OrderStatusConflict(
+                {"detail": f"Can not change an order from {skipped[order.pk]} to {status}"})
+        order.status = status
+        return order
+
+    @staticmethod
+    def delete_order(order):
+        with transaction.atomic():
+            SalesRollupService.remove_orders([order.pk])
+            order.delete()
 
-        if order.user != user:
+    @staticmethod
+    def cancel_order(order, user):
+        if not user.is_staff and order.user_id != user.pk:
             raise PermissionDenied(
                 {"detail": "You can only cancel your own order"})
 
-        if order.status == Order.DELIVERED:
+        if not order.can_transition_to(Order.CANCELED):
             raise ValidationError({"detail": "You can not cancel an order"})
 
-        order.status = Order.CANCELED
-        order.save()
-        return order
+        return OrderService.set_status(order, Order.CANCELED)
+
+    @staticmethod
+    def bulk_update_status(order_ids, new_status):
+        """
+        Move many orders to `new_status` with one conditional
+        `UPDATE ... WHERE status IN (<statuses allowed to move there>)`.
+        The sales rollups are moved in the same transaction. Returns
+        `(updated_ids, skipped)`, where skipped maps each id that was not
+        updated to its current status, or None when it doesn't exist.
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        sources = Order.statuses_leading_to(new_status)
+        updated = []
+        if order_ids and sources:
+            with transaction.atomic():
+                # lock the orders that will move, and take them out of the rollups
+                movable = list(Order.objects.select_for_update()
+                               .filter(pk__in=order_ids, status__in=sources)
+                               .values_list('pk', flat=True))
+                SalesRollupService.remove_orders(movable)
+                updated = OrderService._update_status(order_ids, sources, new_status)
+                SalesRollupService.add_orders(updated)
+                if updated:
+                    # the raw UPDATE sends no post_save
+                    transaction.on_commit(order_cache.bump_version)
+            updated = [order_id for order_id in order_ids if order_id in updated]
+
+        remaining = [order_id for order_id in order_ids if order_id not in set(updated)]
+        current = dict(Order.objects.filter(pk__in=remaining).values_list('id', 'status'))
+        skipped = {order_id: current.get(order_id) for order_id in remaining}
+        return updated, skipped
+
+    @staticmethod
+    def _update_status(order_ids, sources, new_status):
+        """One conditional UPDATE; returns the set of ids it changed"""
+        qn = connection.ops.quote_name
+        pk = Order._meta.pk
+        id_params = [pk.get_db_prep_value(order_id, connection) for order_id in order_ids]
+        updated_at = Order._meta.get_field('updated_at').get_db_prep_value(
+            timezone.now(), connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(Order._meta.db_table)} "
+                f"SET {qn('status')} = %s, {qn('updated_at')} = %s "
+                f"WHERE {qn('id')} IN ({', '.join(['%s'] * len(id_params))}) "
+                f"AND {qn('status')} IN ({', '.join(['%s'] * len(sources))}) "
+                f"RETURNING {qn('id')}",
+                [new_status, updated_at, *id_params, *sources])
+            return {pk.to_python(row[0]) for row in cursor.fetchall()}
+
+
+class PaymentEventService:
+    # SSLCommerz statuses of a successful payment
+    PAID_STATUSES = {'VALID', 'VALIDATED'}
+
+    @staticmethod
+    def record(kind, data):
+        """
+        Append a gateway callback to the event log with a single
+        `INSERT ... ON CONFLICT DO NOTHING`; repeated deliveries of the same
+        callback are dropped by the unique `dedupe_key`.
+        """
+        payload = {key: str(value) for key, value in data.items()}
+        tran_id = payload.get('tran_id', '')[:100]
+        val_id = payload.get('val_id', '')[:100]
+        try:
+            order_id = UUID(tran_id.split('_', 1)[1]) if '_' in tran_id else None
+        except ValueError:
+            order_id = None
+        try:
+            amount = Decimal(payload['amount']).quantize(Decimal('0.01'))
+        except (KeyError, InvalidOperation):
+            amount = None
+        PaymentEvent.objects.bulk_create([PaymentEvent(
+            kind=kind,
+            tran_id=tran_id,
+            val_id=val_id,
+            order_id=order_id,
+            gateway_status=payload.get('status', '')[:30],
+            amount=amount,
+            payload=payload,
+            dedupe_key=f"{kind}:{tran_id}:{val_id}"[:255],
+        )], ignore_conflicts=True)
+
+    @staticmethod
+    def process_pending(batch_size=500, received_before=None):
+        """
+        Process up to `batch_size` unprocessed events, oldest first, and
+        return `{outcome: count}`. Rows are claimed with `SKIP LOCKED`, so
+        several workers can drain the log side by side. Valid success
+        callbacks move their orders from Unpaid to Pending with one
+        `bulk_update_status`; fail/cancel callbacks are only recorded. An order
+        that already moved (e.g. a second success callback) is ignored.
+        """
+        with transaction.atomic():
+            pending = PaymentEvent.objects.filter(processed_at__isnull=True)
+            if received_before is not None:
+                pending = pending.filter(received_at__lt=received_before)
+            events = list(pending.select_for_update(skip_locked=True)
+                          .order_by('id')[:batch_size])
+            if not events:
+                return {}
+
+            gateway = payments.get_gateway()
+            orders = dict(Order.objects.filter(
+                pk__in={event.order_id for event in events if event.order_id})
+                .values_list('pk', 'total_price'))
+            outcomes = {}
+            paying = {}
+            for event in events:
+                if event.kind != PaymentEvent.SUCCESS:
+                    outcomes[event.pk] = (PaymentEvent.RECORDED, '')
+                elif event.order_id not in orders:
+                    outcomes[event.pk] = (PaymentEvent.INVALID, 'unknown order')
+                elif event.gateway_status not in PaymentEventService.PAID_STATUSES:
+                    outcomes[event.pk] = (PaymentEvent.INVALID, 'payment not valid')
+                elif event.amount != orders[event.order_id]:
+                    outcomes[event.pk] = (PaymentEvent.INVALID, 'amount mismatch')
+                elif not gateway.verify_callback(event.payload):
+                    outcomes[event.pk] = (PaymentEvent.INVALID, 'bad signature')
+                elif event.order_id in paying:
+                    outcomes[event.pk] = (PaymentEvent.IGNORED, 'duplicate payment')
+                else:
+                    paying[event.order_id] = event.pk
+
+            updated, skipped = OrderService.bulk_update_status(list(paying), Order.PENDING)
+            for order_id in updated:
+                outcomes[paying[order_id]] = (PaymentEvent.APPLIED, '')
+            for order_id, current in skipped.items():
+                outcomes[paying[order_id]] = (PaymentEvent.IGNORED, f"order is {current}")
+
+            now = timezone.now()
+            groups = {}
+            for pk, outcome in outcomes.items():
+                groups.setdefault(outcome, []).append(pk)
+            counts = {}
+            for (outcome, detail), pks in groups.items():
+                PaymentEvent.objects.filter(pk__in=pks).update(
+                    processed_at=now, outcome=outcome, detail=detail)
+                counts[outcome] = counts.get(outcome, 0) + len(pks)
+            return counts
+
+    @staticmethod
+    def process_all(batch_size=500, received_before=None):
+        """Process batches until no unprocessed event is left"""
+        totals = {}
+        while True:
+            counts = PaymentEventService.process_pending(batch_size, received_before)
+            if not counts:
+                return totals
+            for outcome, count in counts.items():
+                totals[outcome] = totals.get(outcome, 0) + count
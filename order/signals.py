@@ -0,0 +1,11 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from order import cache as order_cache
+from order.models import Order
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order_validators(sender, **kwargs):
+    # bump after commit so a concurrent reader can't re-cache the old rows
+    transaction.on_commit(order_cache.bump_version)
@@ -1,3 +1,633 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import time
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import requests
+from asgiref.sync import async_to_sync
+from django.core import checks
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from order import cart_store, payments
+from order.models import Cart, CartItem, Order, OrderItem, PaymentEvent
+from order.views import OrderViewset
+from order.services import CartService, OrderService, OrderStatusConflict, PaymentEventService
+from product.models import Product
+from users.models import User
 
-# Create your tests here.
+
+def shared_cache(location):
+    return {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': location,
+    }}
+
+
+class CartStoreTests(TestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        settings = override_settings(CART_STORE='cache', CACHES=shared_cache(location.name))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create(email='cart@example.com')
+        self.cart = Cart.objects.create(user=self.user)
+        self.product = Product.objects.create(name='Walker', description='', price=Decimal('5.00'))
+
+    def test_changes_are_written_behind(self):
+        cart_store.add_items(self.cart.pk, self.user, [(self.product.pk, 1)])
+        item = CartItem.objects.get(cart=self.cart)
+        self.assertIsNone(Cart.objects.get(pk=self.cart.pk).dirty_since)
+
+        cart_store.set_quantity(self.cart.pk, self.user, item.pk, 4)
+        self.assertEqual(CartItem.objects.get(pk=item.pk).quantity, 1)
+        self.assertIsNotNone(Cart.objects.get(pk=self.cart.pk).dirty_since)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(cart_store.flush_dirty(), 1)
+        self.assertEqual(CartItem.objects.get(pk=item.pk).quantity, 4)
+        self.assertIsNone(Cart.objects.get(pk=self.cart.pk).dirty_since)
+        self.assertEqual(cart_store.flush_dirty(), 0)
+
+    def test_dirty_marker_is_per_cart(self):
+        cart_store.add_items(self.cart.pk, self.user, [(self.product.pk, 1)])
+        item = CartItem.objects.get(cart=self.cart)
+        cart_store.set_quantity(self.cart.pk, self.user, item.pk, 2)
+        self.assertIsNotNone(cache.get(f"cart:{self.cart.pk}:dirty"))
+        self.assertIsNone(cache.get('cart:dirty'))
+
+
+class CartStoreCheckTests(TestCase):
+    def run_checks(self):
+        return [error.id for error in checks.run_checks(tags=[checks.Tags.caches])]
+
+    @override_settings(CART_STORE='cache', CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_rejected(self):
+        self.assertIn('order.E001', self.run_checks())
+
+    @override_settings(CART_STORE='cache', CACHES=shared_cache(tempfile.gettempdir()))
+    def test_shared_cache_is_accepted(self):
+        self.assertNotIn('order.E001', self.run_checks())
+
+
+class OrderStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.customer = User.objects.create_user(email='customer@example.com', password='x')
+        self.order = Order.objects.create(user=self.customer, total_price=Decimal('10.00'))
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def test_stale_read_can_not_apply_a_disallowed_move(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        OrderService.set_status(self.order, Order.CANCELED)
+        with self.assertRaises(OrderStatusConflict):
+            OrderService.set_status(stale, Order.PENDING)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, Order.CANCELED)
+
+    def test_staff_cancel_follows_transitions(self):
+        OrderService.set_status(self.order, Order.PENDING)
+        OrderService.set_status(self.order, Order.COMPLETE)
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(f'/api/v1/orders/{self.order.pk}/cancel/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, Order.COMPLETE)
+
+    def test_owner_cancels_unpaid_order(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(f'/api/v1/orders/{self.order.pk}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, Order.CANCELED)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.staff)
+        self.product = Product.objects.create(name='Walker', description='', price=Decimal('5.00'))
+        self.orders = [Order.objects.create(user=self.staff, total_price=Decimal('10.00'))
+                       for _ in range(3)]
+        start = timezone.now() - timedelta(hours=1)
+        for minutes, order in enumerate(self.orders):
+            Order.objects.filter(pk=order.pk).update(created_at=start + timedelta(minutes=minutes))
+        for order in self.orders[:2]:
+            OrderItem.objects.create(order=order, product=self.product, quantity=2,
+                                     price=Decimal('5.00'), total_price=Decimal('10.00'))
+
+    @mock.patch.object(OrderViewset, 'export_chunk_size', 2)
+    def test_csv_is_streamed_in_chunks(self):
+        chunk_sizes = []
+        iterator = QuerySet.iterator
+
+        def recording_iterator(queryset, *args, **kwargs):
+            chunk_sizes.append(kwargs.get('chunk_size'))
+            return iterator(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'iterator', recording_iterator):
+            response = self.client.get('/api/v1/orders/export/?file_format=csv')
+            self.assertIsInstance(response, StreamingHttpResponse)
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(chunk_sizes, [2])
+
+        header, *rows = csv.reader(io.StringIO(content))
+        self.assertEqual(header[:5], ['order_id', 'created_at', 'user_email', 'status', 'order_total'])
+        self.assertEqual([row[0] for row in rows], [str(order.pk) for order in self.orders])
+        self.assertEqual(rows[0][2:], ['staff@example.com', Order.UNPAID, '10.00',
+                                       str(self.product.pk), 'Walker', '2', '5.00', '10.00'])
+        self.assertEqual(rows[2][5:], [''] * 5)
+
+
+class OrderListTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='buyer@example.com', password='x')
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.other = User.objects.create_user(email='other@example.com', password='x')
+        self.products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='', price=Decimal('5.00')) for i in range(3)])
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def make_orders(self, count):
+        for user in (self.customer, self.other):
+            orders = Order.objects.bulk_create([
+                Order(user=user, total_price=Decimal('15.00')) for _ in range(count)])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1,
+                          price=product.price, total_price=product.price)
+                for order in orders for product in self.products])
+
+    def assertListCost(self, user, url, num_queries, count):
+        self.client.force_authenticate(user)
+        cache.clear()
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], count)
+        return response
+
+    def test_query_count_does_not_grow_with_orders_or_items(self):
+        for count in (2, 40):
+            self.make_orders(count - Order.objects.filter(user=self.customer).count())
+            # conditional GET validators, page count, the page
+            response = self.assertListCost(self.customer, '/api/v1/orders/', 3, count)
+            self.assertEqual({order['item_count'] for order in response.data['results']}, {3})
+            self.assertListCost(self.staff, '/api/v1/orders/', 3, 2 * count)
+            # ... plus the items and their products
+            response = self.assertListCost(
+                self.customer, '/api/v1/orders/?expand=items', 5, count)
+            self.assertEqual({len(order['items']) for order in response.data['results']}, {3})
+            self.assertListCost(self.staff, '/api/v1/orders/?expand=items', 5, 2 * count)
+
+
+class PaymentCallbackTests(TestCase):
+    def callback(self):
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        return client.post('/api/v1/payment/success/', {'tran_id': 'txn_1', 'val_id': 'v1'})
+
+    @override_settings(PAYMENT_EVENTS_INLINE=True)
+    def test_inline_processing_failure_still_redirects(self):
+        with mock.patch.object(PaymentEventService, 'process_pending',
+                               side_effect=RuntimeError('gateway down')), \
+                self.assertLogs('order.views', 'ERROR'):
+            response = self.callback()
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith('/payment/success'))
+        # left for the worker
+        self.assertTrue(PaymentEvent.objects.filter(processed_at__isnull=True).exists())
+
+    @override_settings(PAYMENT_EVENTS_INLINE=False)
+    def test_callback_only_records_without_inline_processing(self):
+        with mock.patch.object(PaymentEventService, 'process_pending') as process_pending:
+            self.assertEqual(self.callback().status_code, 302)
+        process_pending.assert_not_called()
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+
+@override_settings(PAYMENT_GATEWAY='order.payments.LocalGateway')
+class PaymentEventProcessingTests(TestCase):
+    def setUp(self):
+        payments.get_gateway.cache_clear()
+        self.addCleanup(payments.get_gateway.cache_clear)
+        self.gateway = payments.get_gateway()
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+
+    def order(self, total='25.00'):
+        return Order.objects.create(user=self.user, total_price=Decimal(total))
+
+    def record(self, order, kind=PaymentEvent.SUCCESS, **changes):
+        payload = self.gateway.callback_payload(f"order_{order.pk}", order.total_price)
+        payload.update(changes)
+        PaymentEventService.record(kind, payload)
+
+    def outcomes(self):
+        return list(PaymentEvent.objects.order_by('id').values_list('outcome', 'detail'))
+
+    def test_valid_success_moves_order_to_pending(self):
+        order = self.order()
+        self.record(order)
+        self.assertEqual(PaymentEventService.process_pending(), {PaymentEvent.APPLIED: 1})
+        self.assertEqual(Order.objects.get(pk=order.pk).status, Order.PENDING)
+        self.assertEqual(PaymentEventService.process_pending(), {})
+
+    def test_invalid_callbacks_leave_order_unpaid(self):
+        order = self.order()
+        self.record(order, verify_sign='0' * 32)
+        self.record(order, amount='1.00', val_id='other')
+        self.record(order, status='FAILED', val_id='failed')
+        PaymentEventService.process_pending()
+        self.assertEqual(self.outcomes(), [
+            (PaymentEvent.INVALID, 'bad signature'),
+            (PaymentEvent.INVALID, 'amount mismatch'),
+            (PaymentEvent.INVALID, 'payment not valid'),
+        ])
+        self.assertEqual(Order.objects.get(pk=order.pk).status, Order.UNPAID)
+
+    def test_second_payment_and_other_kinds_are_not_applied(self):
+        paid, canceled = self.order(), self.order()
+        self.record(paid)
+        self.record(paid)
+        self.record(canceled, kind=PaymentEvent.CANCEL)
+        PaymentEventService.process_pending()
+        self.record(paid)
+        PaymentEventService.process_pending()
+        self.assertEqual(self.outcomes(), [
+            (PaymentEvent.APPLIED, ''),
+            (PaymentEvent.IGNORED, 'duplicate payment'),
+            (PaymentEvent.RECORDED, ''),
+            (PaymentEvent.IGNORED, f'order is {Order.PENDING}'),
+        ])
+        self.assertEqual(Order.objects.get(pk=canceled.pk).status, Order.UNPAID)
+
+    def test_events_are_claimed_in_batches_oldest_first(self):
+        orders = [self.order() for _ in range(5)]
+        for order in orders:
+            self.record(order)
+        claims = []
+        select_for_update = QuerySet.select_for_update
+
+        def recording_select_for_update(queryset, *args, **kwargs):
+            if queryset.model is PaymentEvent:
+                claims.append(kwargs)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', recording_select_for_update):
+            self.assertEqual(PaymentEventService.process_pending(batch_size=2),
+                             {PaymentEvent.APPLIED: 2})
+            self.assertEqual(
+                [Order.objects.get(pk=order.pk).status for order in orders],
+                [Order.PENDING] * 2 + [Order.UNPAID] * 3)
+            self.assertEqual(PaymentEventService.process_all(batch_size=2),
+                             {PaymentEvent.APPLIED: 3})
+        # other workers skip the rows a batch has claimed
+        self.assertEqual(claims, [{'skip_locked': True}] * 4)
+        self.assertFalse(PaymentEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_success_callback_pays_the_order_inline(self):
+        order = self.order()
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        response = client.post('/api/v1/payment/success/',
+                               self.gateway.callback_payload(f"order_{order.pk}", order.total_price))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, Order.PENDING)
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='cart@example.com', password='x')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.user)
+
+    def fill(self, lines):
+        """Lines priced 1.50, 2.50, ... with quantities 1, 2, ...; returns the total"""
+        start = CartItem.objects.filter(cart=self.cart).count()
+        products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='', price=Decimal(i) + Decimal('0.50'))
+            for i in range(start + 1, lines + 1)])
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=i)
+            for i, product in enumerate(products, start + 1)])
+        return sum((Decimal(i) + Decimal('0.50')) * i for i in range(1, lines + 1))
+
+    def test_totals_are_computed_by_the_database(self):
+        total = self.fill(3)
+        response = self.client.get(f'/api/v1/carts/{self.cart.pk}/')
+        self.assertEqual(response.data['total_price'], total)
+        self.assertEqual([item['total_price'] for item in response.data['items']],
+                         [Decimal('1.50'), Decimal('5.00'), Decimal('10.50')])
+
+        response = self.client.get(f'/api/v1/carts/{self.cart.pk}/summary/')
+        self.assertEqual(response.data, {'item_count': 6, 'total_price': total})
+
+    def test_query_count_does_not_grow_with_lines(self):
+        for lines in (1, 50, 500):
+            total = self.fill(lines)
+            # one aggregate query, no items or products loaded
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/api/v1/carts/{self.cart.pk}/summary/')
+            self.assertEqual(response.data['total_price'], total)
+            # the cart with its total, then the items with line totals and products
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/v1/carts/{self.cart.pk}/')
+            self.assertEqual(len(response.data['items']), lines)
+
+    def test_empty_cart_summary(self):
+        response = self.client.get(f'/api/v1/carts/{self.cart.pk}/summary/')
+        self.assertEqual(response.data, {'item_count': 0, 'total_price': Decimal('0.00')})
+
+    def test_unknown_or_malformed_cart_is_not_found(self):
+        other = Cart.objects.create(user=User.objects.create(email='other@example.com'))
+        for cart_id in ('not-a-uuid', other.pk):
+            for url in (f'/api/v1/carts/{cart_id}/summary/', f'/api/v1/carts/{cart_id}/'):
+                self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_malformed_cart_is_not_found_with_cache_store(self):
+        with override_settings(CART_STORE='cache'):
+            for url in ('/api/v1/carts/not-a-uuid/summary/', '/api/v1/carts/not-a-uuid/'):
+                self.assertEqual(self.client.get(url).status_code, 404, url)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.user)
+
+    def fill(self, lines):
+        products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='', price=Decimal(i) + Decimal('0.25'))
+            for i in range(1, lines + 1)])
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=i)
+            for i, product in enumerate(products, 1)])
+        return products
+
+    def checkout(self):
+        return self.client.post('/api/v1/orders/', {'cart_id': str(self.cart.pk)}, format='json')
+
+    def test_lines_are_copied_at_current_prices_and_the_cart_cleared(self):
+        walker, cane = self.fill(2)
+        Product.objects.filter(pk=cane.pk).update(price=Decimal('9.99'))
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total_price, Decimal('1.25') + 2 * Decimal('9.99'))
+        self.assertEqual(response.data['total_price'], order.total_price)
+        self.assertEqual(
+            list(order.items.order_by('product_id')
+                 .values_list('product_id', 'quantity', 'price', 'total_price')),
+            [(walker.pk, 1, Decimal('1.25'), Decimal('1.25')),
+             (cane.pk, 2, Decimal('9.99'), Decimal('19.98'))])
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_empty_cart_is_rejected(self):
+        self.assertEqual(self.checkout().status_code, 400)
+        # the service itself rolls back the order it started
+        with self.assertRaises(ValidationError):
+            OrderService.create_order(self.user.pk, self.cart.pk)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cart_is_checked_out_once(self):
+        self.fill(1)
+        self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(self.checkout().status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        counts = []
+        for lines in (1, 50):
+            products = Product.objects.bulk_create([
+                Product(name=f'Line {i}', description='', price=Decimal('1.00'))
+                for i in range(lines)])
+            CartItem.objects.bulk_create([
+                CartItem(cart=self.cart, product=product, quantity=1) for product in products])
+            with CaptureQueriesContext(connection) as queries:
+                order = OrderService.create_order(self.user.pk, self.cart.pk)
+            self.assertEqual(order.total_price, lines)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Needs real row locks, so it runs on PostgreSQL, not on SQLite"""
+    checkouts = 8
+
+    def run_concurrently(self, calls):
+        barrier = threading.Barrier(len(calls))
+        results = [None] * len(calls)
+
+        def run(index, call):
+            barrier.wait()
+            try:
+                results[index] = call()
+            except Exception as exc:
+                results[index] = exc
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index, call))
+                   for index, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def cart_with_lines(self, email, product):
+        user = User.objects.create(email=email)
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        return user, cart
+
+    def test_many_users_check_out_at_once(self):
+        product = Product.objects.create(name='Walker', description='', price=Decimal('5.00'))
+        carts = [self.cart_with_lines(f'user{i}@example.com', product)
+                 for i in range(self.checkouts)]
+        results = self.run_concurrently([
+            lambda user=user, cart=cart: OrderService.create_order(user.pk, cart.pk)
+            for user, cart in carts])
+        self.assertTrue(all(isinstance(order, Order) for order in results), results)
+        self.assertEqual(Order.objects.filter(total_price=Decimal('10.00')).count(), self.checkouts)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_one_cart_checked_out_at_once_makes_one_order(self):
+        product = Product.objects.create(name='Walker', description='', price=Decimal('5.00'))
+        user, cart = self.cart_with_lines('buyer@example.com', product)
+        results = self.run_concurrently(
+            [lambda: OrderService.create_order(user.pk, cart.pk)] * self.checkouts)
+        self.assertEqual(sum(isinstance(result, Order) for result in results), 1)
+        self.assertEqual(sum(isinstance(result, ValidationError) for result in results),
+                         self.checkouts - 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+
+
+class BulkAddCartItemsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='cart@example.com', password='x')
+        self.cart = Cart.objects.create(user=self.user)
+        self.walker, self.cane = Product.objects.bulk_create([
+            Product(name='Walker', description='', price=Decimal('5.00')),
+            Product(name='Cane', description='', price=Decimal('2.00'))])
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, items, cart_id=None):
+        return self.client.post(f'/api/v1/carts/{cart_id or self.cart.pk}/items/bulk/',
+                                {'items': items}, format='json')
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+
+    def test_duplicate_products_are_merged(self):
+        response = self.bulk([{'product_id': self.walker.pk, 'quantity': 1},
+                              {'product_id': self.cane.pk, 'quantity': 3},
+                              {'product_id': self.walker.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.quantities(), {self.walker.pk: 3, self.cane.pk: 3})
+        self.assertEqual(sorted(item['quantity'] for item in response.data['items']), [3, 3])
+
+    def test_quantities_accumulate_on_conflict(self):
+        CartItem.objects.create(cart=self.cart, product=self.walker, quantity=4)
+        with self.assertNumQueries(1):
+            lines = CartService.add_items(self.cart.pk, [(self.walker.pk, 2), (self.cane.pk, 1)])
+        self.assertEqual({product_id: quantity for product_id, (_, quantity) in lines.items()},
+                         {self.walker.pk: 6, self.cane.pk: 1})
+        self.assertEqual(self.quantities(), {self.walker.pk: 6, self.cane.pk: 1})
+
+    def test_line_cap(self):
+        line = {'product_id': self.walker.pk, 'quantity': 1}
+        self.assertEqual(self.bulk([line] * 500).status_code, 201)
+        self.assertEqual(self.quantities(), {self.walker.pk: 500})
+        response = self.bulk([line] * 501)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {self.walker.pk: 500})
+
+    def test_invalid_lines_are_rejected(self):
+        for items in ([], [{'product_id': 999, 'quantity': 1}],
+                      [{'product_id': self.walker.pk, 'quantity': 0}]):
+            self.assertEqual(self.bulk(items).status_code, 400, items)
+        self.assertEqual(self.quantities(), {})
+
+    def test_other_users_cart_is_not_found(self):
+        other = Cart.objects.create(user=User.objects.create(email='other@example.com'))
+        line = [{'product_id': self.walker.pk, 'quantity': 1}]
+        self.assertEqual(self.bulk(line, cart_id=other.pk).status_code, 404)
+        self.assertEqual(self.bulk(line, cart_id='not-a-uuid').status_code, 404)
+        self.assertFalse(CartItem.objects.exists())
+
+
+GATEWAY_OPTIONS = {'store_id': 'store', 'store_pass': 'secret', 'is_sandbox': True,
+                   'connect_timeout': 2, 'read_timeout': 5, 'local_delay': 0}
+
+
+@override_settings(SSLCOMMERZ=GATEWAY_OPTIONS)
+class PaymentGatewayTests(TestCase):
+    def setUp(self):
+        payments.get_gateway.cache_clear()
+        self.addCleanup(payments.get_gateway.cache_clear)
+
+    def test_gateway_is_chosen_by_setting_and_built_once(self):
+        self.assertIsInstance(payments.get_gateway(), payments.SSLCommerzGateway)
+        self.assertIs(payments.get_gateway(), payments.get_gateway())
+        payments.get_gateway.cache_clear()
+        with override_settings(PAYMENT_GATEWAY='order.payments.LocalGateway'):
+            self.assertIsInstance(payments.get_gateway(), payments.LocalGateway)
+
+    def test_session_request_uses_pooled_session_and_timeouts(self):
+        gateway = payments.SSLCommerzGateway(GATEWAY_OPTIONS)
+        reply = mock.Mock(**{'json.return_value': {'status': 'SUCCESS'}})
+        with mock.patch.object(gateway.http, 'post', return_value=reply) as post:
+            self.assertEqual(gateway.create_session({'tran_id': 't'}), {'status': 'SUCCESS'})
+        post.assert_called_once_with(
+            'https://sandbox.sslcommerz.com/gwprocess/v4/api.php',
+            data={'tran_id': 't', 'store_id': 'store', 'store_passwd': 'secret'},
+            timeout=(2, 5))
+
+    def test_gateway_failures_raise_gateway_error(self):
+        gateway = payments.SSLCommerzGateway(GATEWAY_OPTIONS)
+        http_error = mock.Mock(**{'raise_for_status.side_effect': requests.HTTPError('503')})
+        bad_json = mock.Mock(**{'json.side_effect': ValueError('not json')})
+        for outcome in (requests.Timeout('read timed out'), requests.ConnectionError('refused'),
+                        http_error, bad_json):
+            effect = {'side_effect': outcome} if isinstance(outcome, Exception) else {'return_value': outcome}
+            with mock.patch.object(gateway.http, 'post', **effect), \
+                    self.assertRaises(payments.PaymentGatewayError):
+                gateway.create_session({'tran_id': 't'})
+
+    def test_verify_callback(self):
+        gateway = payments.LocalGateway(GATEWAY_OPTIONS)
+        payload = gateway.callback_payload('order_1', Decimal('25.00'))
+        self.assertTrue(gateway.verify_callback(payload))
+        self.assertFalse(gateway.verify_callback(dict(payload, amount='1.00')))
+        self.assertFalse(payments.LocalGateway(dict(GATEWAY_OPTIONS, store_pass='other'))
+                         .verify_callback(payload))
+        self.assertFalse(gateway.verify_callback({k: v for k, v in payload.items() if k != 'amount'}))
+        self.assertFalse(gateway.verify_callback({k: v for k, v in payload.items()
+                                                  if k != 'verify_sign'}))
+
+    def test_async_sessions_do_not_block_each_other(self):
+        # a slow gateway: sessions started together finish in about one delay
+        delay, sessions = 0.2, 8
+        gateway = payments.LocalGateway(dict(GATEWAY_OPTIONS, local_delay=delay))
+
+        async def start_sessions():
+            return await asyncio.gather(*(gateway.acreate_session({'tran_id': f't{i}'})
+                                          for i in range(sessions)))
+
+        started = time.monotonic()
+        results = async_to_sync(start_sessions)()
+        elapsed = time.monotonic() - started
+        self.assertEqual([result['status'] for result in results], ['SUCCESS'] * sessions)
+        self.assertLess(elapsed, delay * sessions / 2)
+
+
+@override_settings(SSLCOMMERZ=GATEWAY_OPTIONS)
+class InitiatePaymentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        payments.get_gateway.cache_clear()
+        self.addCleanup(payments.get_gateway.cache_clear)
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        product = Product.objects.create(name='Walker', description='', price=Decimal('5.00'))
+        self.order = Order.objects.create(user=self.user, total_price=Decimal('10.00'))
+        OrderItem.objects.create(order=self.order, product=product, quantity=2,
+                                 price=Decimal('5.00'), total_price=Decimal('10.00'))
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.user)
+
+    def initiate(self):
+        return self.client.post('/api/v1/payment/initiate/', {
+            'order_id': str(self.order.pk), 'amount': '10.00', 'num_items': 1}, format='json')
+
+    @override_settings(PAYMENT_GATEWAY='order.payments.LocalGateway')
+    def test_local_gateway_session(self):
+        response = self.initiate()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'tran_id=order_{self.order.pk}', response.data['payment_url'])
+
+    def test_unreachable_gateway_is_bad_gateway(self):
+        with mock.patch.object(payments.get_gateway().http, 'post',
+                               side_effect=requests.Timeout('read timed out')):
+            response = self.initiate()
+        self.assertEqual(response.status_code, 502)
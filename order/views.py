@@ -1,23 +1,31 @@
-from django.http import HttpResponseRedirect
+import logging
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.db.models import Prefetch
 from django.shortcuts import render
-from decouple import config
+from rest_framework.generics import get_object_or_404
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
+from api import idempotency
+from api.mixins import ConditionalGetMixin
 from order import serializers as orderSz
-from order.serializers import CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer
-from order.models import Cart, CartItem, Order, OrderItem
+from order.serializers import CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, BulkAddCartItemSerializer
+from order.models import Cart, CartItem, Order, OrderItem, PaymentEvent
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
-from order.services import OrderService
+from drf_yasg.utils import swagger_auto_schema
+from order.services import CartService, OrderService, PaymentEventService
+from order import cache as order_cache, cart_store, export, payments
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework import status
-from sslcommerz_lib import SSLCOMMERZ 
 from rest_framework.permissions import AllowAny
 # from django.conf import settings
 from django.conf import settings as django_settings
 from decimal import Decimal, InvalidOperation
 
+logger = logging.getLogger(__name__)
+
 
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     serializer_class = CartSerializer
@@ -35,7 +43,52 @@ class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, Gener
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Cart.objects.none()
-        return Cart.objects.prefetch_related('items__product').filter(user=self.request.user)
+        return (CartService.carts_with_totals()
+                .prefetch_related(Prefetch('items', queryset=CartService.items_with_totals()))
+                .filter(user=self.request.user))
+
+    def get_cart_id(self):
+        """The cart id from the URL; a malformed one is not found, as in get_object()"""
+        try:
+            return Cart._meta.pk.to_python(self.kwargs['pk'])
+        except ValidationError:
+            raise Http404('No Cart matches the given query.')
+
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """Item count and total only, for the header badge"""
+        pk = self.get_cart_id()
+        if cart_store.enabled():
+            items = cart_store.items(pk, request.user)
+            data = {
+                'item_count': sum(item.quantity for item in items),
+                'total_price': sum((item.product.price * item.quantity for item in items), Decimal('0')),
+            }
+        else:
+            data = CartService.summary(pk, request.user)
+            if data is None:
+                raise Http404('No Cart matches the given query.')
+        return Response(orderSz.CartSummarySerializer(data).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not cart_store.enabled():
+            return super().retrieve(request, *args, **kwargs)
+        cart_id = self.get_cart_id()
+        items = cart_store.items(cart_id, request.user)
+        return Response({
+            'id': cart_id,
+            'user': request.user.pk,
+            'items': CartItemSerializer(items, many=True).data,
+            'total_price': sum(item.product.price * item.quantity for item in items),
+        })
+
+    def perform_destroy(self, instance):
+        if cart_store.enabled():
+            with cart_store.locked(instance.pk):
+                instance.delete()
+                cart_store.forget(instance.pk)
+            return
+        instance.delete()
 
 
 class CartItemViewSet(ModelViewSet):
@@ -43,9 +96,11 @@ class CartItemViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_serializer_class(self):
-        if self.request.method == 'POST':
+        if self.action == 'bulk':
+            return BulkAddCartItemSerializer
+        if self.action == 'create':
             return AddCartItemSerializer
-        elif self.request.method == 'PATCH':
+        elif self.action == 'partial_update':
             return UpdateCartItemSerializer
         return CartItemSerializer
 
@@ -58,13 +113,77 @@ class CartItemViewSet(ModelViewSet):
         return ctx
 
     def get_queryset(self):
-        return (CartItem.objects
-                .select_related('product','cart')
+        if getattr(self, 'swagger_fake_view', False):
+            return CartItem.objects.none()
+        return (CartService.items_with_totals()
+                .select_related('cart')
                 .filter(cart_id=self.kwargs.get('cart__pk'),
-                        cart__user=self.request.user))
+                        cart__user=self.request.user)
+                .order_by('id'))
+
+    # with the cache cart store, reads and changes go through order.cart_store
+
+    def list(self, request, *args, **kwargs):
+        if not cart_store.enabled():
+            return super().list(request, *args, **kwargs)
+        items = cart_store.items(kwargs['cart__pk'], request.user)
+        page = self.paginate_queryset(items)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(items, many=True).data)
 
-class OrderViewset(ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        if not cart_store.enabled():
+            return super().retrieve(request, *args, **kwargs)
+        for item in cart_store.items(kwargs['cart__pk'], request.user):
+            if str(item.pk) == str(kwargs['pk']):
+                return Response(self.get_serializer(item).data)
+        raise Http404('No CartItem matches the given query.')
+
+    def partial_update(self, request, *args, **kwargs):
+        if not cart_store.enabled():
+            return super().partial_update(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
+        cart_store.set_quantity(kwargs['cart__pk'], request.user, kwargs['pk'], quantity)
+        return Response({'quantity': quantity})
+
+    def destroy(self, request, *args, **kwargs):
+        if not cart_store.enabled():
+            return super().destroy(request, *args, **kwargs)
+        cart_store.remove(kwargs['cart__pk'], request.user, kwargs['pk'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Add many services to the cart at once:
+        POST {"items": [{"product_id": 1, "quantity": 2}, ...]}
+        All product ids are validated with one query and the lines are
+        upserted with a single statement.
+        """
+        if not cart_store.enabled():
+            get_object_or_404(Cart, pk=self.kwargs.get('cart__pk'), user=request.user)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class OrderViewset(ConditionalGetMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'delete', 'patch', 'head', 'options']
+    cursor_ordering = '-created_at'
+    conditional_per_user = True
+    conditional_version = staticmethod(order_cache.get_version)
+
+    def create(self, request, *args, **kwargs):
+        """Honors an `Idempotency-Key` header: retries replay the first response"""
+        return idempotency.run(
+            request, 'orders.create',
+            lambda: super(OrderViewset, self).create(request, *args, **kwargs))
+
+    def perform_destroy(self, instance):
+        OrderService.delete_order(instance)
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -78,15 +197,70 @@ class OrderViewset(ModelViewSet):
         serializer = orderSz.UpdateOrderSerializer(
             order, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
         new_status = serializer.validated_data.get('status', order.status)
+        if new_status != order.status:
+            OrderService.set_status(order, new_status)
         return Response({"status": f"Order status updated to {new_status}"})
 
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """
+        Staff only: move many orders to one status.
+        POST {"ids": [...], "status": "Complete"}
+        Orders whose current status can't move to the target are skipped and
+        reported with their current status (null when the id doesn't exist).
+        """
+        serializer = orderSz.BulkUpdateOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        new_status = serializer.validated_data['status']
+        updated, skipped = OrderService.bulk_update_status(
+            serializer.validated_data['ids'], new_status)
+        return Response({
+            'status': new_status,
+            'updated': updated,
+            'skipped': [{'id': order_id, 'current_status': current}
+                        for order_id, current in skipped.items()],
+        })
+
+    export_chunk_size = 2000
+
+    @swagger_auto_schema(
+        operation_summary='Stream orders with their items as CSV or JSON Lines',
+        query_serializer=orderSz.OrderExportQuerySerializer,
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Staff only. Orders placed between `start` and `end` (inclusive,
+        YYYY-MM-DD), optionally limited to `status`, streamed oldest first;
+        memory stays bounded by one chunk of orders whatever the range.
+        """
+        query = orderSz.OrderExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        orders = export.iter_orders(
+            export.orders(params.get('start'), params.get('end'), params.get('status')),
+            chunk_size=self.export_chunk_size)
+        fmt = params['file_format']
+        response = StreamingHttpResponse(
+            export.lines(fmt, orders), content_type=export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+        return response
+
     def get_permissions(self):
-        if self.action in ['update_status', 'destroy']:
+        if self.action in ['update_status', 'bulk_update_status', 'export', 'destroy']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    def expand_items(self):
+        """Items are nested on retrieve, or on list with `?expand=items`"""
+        if self.action == 'retrieve':
+            return True
+        if getattr(self, 'swagger_fake_view', False):
+            return False
+        expand = self.request.query_params.get('expand', '')
+        return 'items' in expand.split(',')
+
     def get_serializer_class(self):
         if self.action == 'cancel':
             return orderSz.EmptySerializer
@@ -94,6 +268,10 @@ class OrderViewset(ModelViewSet):
             return orderSz.CreateOrderSerializer
         elif self.action == 'update_status':
             return orderSz.UpdateOrderSerializer
+        elif self.action == 'bulk_update_status':
+            return orderSz.BulkUpdateOrderStatusSerializer
+        elif self.action == 'list' and not self.expand_items():
+            return orderSz.OrderListSerializer
         return orderSz.OrderSerializer
 
     def get_serializer_context(self):
@@ -104,16 +282,27 @@ class OrderViewset(ModelViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Order.objects.none()
-        if self.request.user.is_staff:
-            return Order.objects.prefetch_related('items__product').all()
-        return Order.objects.prefetch_related('items__product').filter(user=self.request.user)
+        queryset = Order.objects.order_by('-created_at')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        order_status = self.request.query_params.get('status')
+        if self.action == 'list' and order_status:
+            queryset = queryset.filter(status=order_status)
+        if self.action == 'list' and not self.expand_items():
+            return queryset.annotate(item_count=OrderService.item_count())
+        return queryset.prefetch_related('items__product')
     
     
 @api_view(['POST'])
 def initiate_payment(request):
     if not request.user.is_authenticated:
         return Response({"detail": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-    
+
+    # retries with the same Idempotency-Key reuse the first gateway session
+    return idempotency.run(request, 'payment.initiate', lambda: _initiate_payment(request))
+
+
+def _initiate_payment(request):
     user = request.user
     
     order_id     = request.data.get("order_id") or request.data.get("orderId")
@@ -125,7 +314,7 @@ def initiate_payment(request):
     
     # 1) Fetch order FIRST (so we can safely refer to it later)
     try:
-        order = Order.objects.prefetch_related('items').get(
+        order = Order.objects.annotate(item_count=OrderService.item_count()).get(
             pk=order_id, user=user, status=Order.UNPAID
         )
     except Order.DoesNotExist:
@@ -146,42 +335,15 @@ def initiate_payment(request):
     except (TypeError, ValueError):
         return Response({"error": "Invalid or missing num_items"}, status=status.HTTP_400_BAD_REQUEST)
 
-    if num_items != order.items.count():
+    if num_items != order.item_count:
         return Response({"error": "Item count mismatch"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # 4) SSLCommerz settings (you’re using decouple.config — keep it)
-    ssl_settings = {
-        'store_id':  config('store_id'),
-        'store_pass': config('store_pass'),
-        'issandbox': True
-    }
-    sslcz = SSLCOMMERZ(ssl_settings)
-     
-    backend = django_settings.BACKEND_URL.rstrip('/')
-    post_body = {
-        'total_amount': str(order.total_price),   # SSLCommerz likes string
-        'currency': "BDT",                        # use BDT for SSLCommerz
-        'success_url': f"{backend}/api/v1/payment/success/",
-        'fail_url':    f"{backend}/api/v1/payment/fail/",
-        'cancel_url':  f"{backend}/api/v1/payment/cancel/",
-        'emi_option': 0,
-        'cus_name':  (f"{user.first_name} {user.last_name}".strip() or user.username),
-        'cus_email': user.email,
-        'cus_phone': getattr(user, 'phone_number', '') or 'N/A',
-        'cus_add1':  getattr(user, 'address', '') or 'N/A',
-        'cus_city': "Dhaka",
-        'cus_country': "Bangladesh",
-        'shipping_method': "NO",
-        'multi_card_name': "",
-        'num_of_item': order.items.count(),
-        'product_name': "E-commerce Products",
-        'product_category': "General",
-        'product_profile': "general",
-        'tran_id': f"order_{order.id}",
-    }
-
-    # 6) Create session and return the redirect URL
-    response = sslcz.createSession(post_body)
+    # 4) Create session (shared, pooled gateway client) and return the redirect URL
+    try:
+        response = payments.get_gateway().create_session(
+            payments.session_body(order, user, order.item_count))
+    except payments.PaymentGatewayError:
+        return Response({"error": "Payment gateway unavailable"}, status=status.HTTP_502_BAD_GATEWAY)
     if response.get("status") == "SUCCESS":
         return Response({"payment_url": response.get("GatewayPageURL")})
     return Response({"error": "Payment initiation failed"}, status=status.HTTP_400_BAD_REQUEST)
@@ -189,22 +351,25 @@ def initiate_payment(request):
 def _fe(path: str) -> str:
     return f"{django_settings.FRONTEND_URL.rstrip('/')}{path}"
 
+def _record_callback(request, kind):
+    """
+    Append the callback to the payment event log. With PAYMENT_EVENTS_INLINE
+    on (the default), pending events are processed right away as well; if
+    that fails the customer is still redirected and the events stay pending
+    for the next callback or a `process_payment_events` worker.
+    """
+    PaymentEventService.record(kind, request.data)
+    if django_settings.PAYMENT_EVENTS_INLINE:
+        try:
+            PaymentEventService.process_pending()
+        except Exception:
+            logger.exception("Inline processing of payment events failed")
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @authentication_classes([])   # callbacks come from SSLCommerz, no JWT/cookie
 def payment_success(request):
-    tran_id = request.data.get("tran_id", "")
-
-    # Update order status (defensively)
-    if '_' in tran_id:
-        order_id = tran_id.split('_', 1)[1]
-        try:
-            order = Order.objects.get(id=order_id)
-            order.status = Order.PENDING  # use your constant
-            order.save(update_fields=['status'])
-        except Order.DoesNotExist:
-            pass
-
+    _record_callback(request, PaymentEvent.SUCCESS)
     # Redirect the user to your React page (GET)
     return HttpResponseRedirect(_fe("/payment/success"))
 
@@ -212,12 +377,14 @@ def payment_success(request):
 @permission_classes([AllowAny])
 @authentication_classes([])
 def payment_fail(request):
+    _record_callback(request, PaymentEvent.FAIL)
     return HttpResponseRedirect(_fe("/payment/fail"))
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @authentication_classes([])
 def payment_cancel(request):
+    _record_callback(request, PaymentEvent.CANCEL)
     return HttpResponseRedirect(_fe("/payment/cancel"))
 
 # class HasOrderedProduct(api_view):
@@ -0,0 +1,125 @@
+import time
+from hashlib import md5
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+TIMEOUT = 60 * 15
+# how long one request may hold the rebuild lock before others stop waiting
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from a timestamp so an evicted version never reuses old keys
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached catalog response"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _count(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {
+        'version': get_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def make_key(request, scope):
+    # the host is part of the key because pagination links are absolute
+    raw = f"{request.get_host()}|{request.get_full_path()}"
+    return f"catalog:{get_version()}:{scope}:{md5(raw.encode()).hexdigest()}"
+
+
+def get_or_build(key, build):
+    """
+    Return the cached payload for `key`, building it with `build()` on a miss.
+    `build()` returns `(payload, cacheable)`. Only one caller rebuilds a key at
+    a time; concurrent misses wait for its result instead of rebuilding too.
+    """
+    payload = cache.get(key)
+    if payload is not None:
+        _count(HITS_KEY)
+        return payload
+    _count(MISSES_KEY)
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            payload = cache.get(key)
+            if payload is not None:
+                return payload
+            if cache.get(lock_key) is None:
+                break
+        return build()[0]
+
+    try:
+        payload, cacheable = build()
+        if cacheable:
+            cache.set(key, payload, TIMEOUT)
+        return payload
+    finally:
+        cache.delete(lock_key)
+
+
+def get_many(scope, ids, build):
+    """
+    Per-object cache lookup for a list of ids with a single `get_many`.
+    `build(missing_ids)` returns `{id: payload}` for the ids it could find;
+    those are cached, ids it could not find are left out of the result.
+    """
+    version = get_version()
+    keys = {pk: f"catalog:{version}:{scope}:{pk}" for pk in ids}
+    found = cache.get_many(list(keys.values()))
+    payloads = {pk: found[key] for pk, key in keys.items() if key in found}
+
+    missing = [pk for pk in ids if pk not in payloads]
+    if payloads:
+        _count(HITS_KEY, len(payloads))
+    if missing:
+        _count(MISSES_KEY, len(missing))
+        built = build(missing)
+        cache.set_many({keys[pk]: payload for pk, payload in built.items()}, TIMEOUT)
+        payloads.update(built)
+    return payloads
+
+
+def cached_response(request, scope, view_func):
+    """Serve a read-only catalog view from the versioned response cache"""
+    def build():
+        response = view_func()
+        cacheable = response.status_code == status.HTTP_200_OK
+        return (response.data, response.status_code), cacheable
+
+    data, status_code = get_or_build(make_key(request, scope), build)
+    return Response(data, status=status_code)
@@ -1,4 +1,9 @@
+import re
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import SearchFilter
 from product.models import Product
 
 
@@ -6,5 +11,53 @@ class ProductFilter(FilterSet):
     class Meta:
         model = Product
         fields = {
-            'price': ['gt', 'lt']
-        }
\ No newline at end of file
+            'price': ['gt', 'lt'],
+            'rating_average': ['gte', 'lte'],
+            'rating_count': ['gte'],
+        }
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Keeps the `?search=` contract of DRF's SearchFilter but answers it from the
+    full-text index created in product/migrations/0003_product_search_index.py:
+     - PostgreSQL: generated `search_vector` column + GIN index, ranked with ts_rank
+     - SQLite: FTS5 table, ranked with bm25
+    Every word is matched as a prefix, so partial words from the search box match.
+    Other databases fall back to the plain `icontains` search over `search_fields`.
+    """
+
+    def get_search_words(self, request):
+        words = []
+        for term in self.get_search_terms(request):
+            words.extend(re.findall(r'\w+', term))
+        return words
+
+    def filter_queryset(self, request, queryset, view):
+        words = self.get_search_words(request)
+        if not words:
+            return super().filter_queryset(request, queryset, view)
+
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'postgresql':
+            query = ' & '.join(f'{word}:*' for word in words)
+            return queryset.filter(
+                RawSQL(f"{table}.search_vector @@ to_tsquery('english', %s)", (query,),
+                       output_field=BooleanField())
+            ).annotate(
+                search_rank=RawSQL(
+                    f"ts_rank({table}.search_vector, to_tsquery('english', %s))",
+                    (query,))
+            ).order_by('-search_rank', '-id')
+
+        if connection.vendor == 'sqlite':
+            query = ' '.join(f'"{word}"*' for word in words)
+            return queryset.filter(
+                pk__in=RawSQL(f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s", (query,))
+            ).annotate(
+                search_rank=RawSQL(
+                    f"SELECT rank FROM {table}_fts WHERE {table}_fts MATCH %s AND rowid = {table}.id",
+                    (query,))
+            ).order_by('search_rank', '-id')
+
+        return super().filter_queryset(request, queryset, view)
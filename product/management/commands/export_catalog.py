@@ -0,0 +1,84 @@
+import csv
+import json
+import sys
+import time
+from django.core.management.base import BaseCommand
+from product.models import Product, ProductImage
+
+FIELDS = ['id', 'name', 'description', 'price', 'images']
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the catalog out as JSON Lines or CSV in constant memory, "
+        "reading products with a server-side cursor"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help="Output file, or '-' (default) for stdout")
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            help="Defaults to the file extension, jsonl for stdout")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        out = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+
+        started = time.monotonic()
+        total = 0
+        try:
+            writer = csv.DictWriter(out, fieldnames=FIELDS) if fmt == 'csv' else None
+            if writer:
+                writer.writeheader()
+            for row in self.iter_rows(options['chunk_size']):
+                if writer:
+                    writer.writerow({**row, 'images': '|'.join(row['images'])})
+                else:
+                    out.write(json.dumps(row) + '\n')
+                total += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {total} products in {elapsed:.2f}s "
+            f"({total / elapsed if elapsed else total:.0f} rows/s)"))
+
+    def iter_rows(self, chunk_size):
+        """
+        Products come from `.iterator()`; their images are fetched per chunk
+        with one `product_id__in` query, so memory stays bounded by chunk size.
+        """
+        products = (
+            Product.objects
+            .order_by('id')
+            .values_list('id', 'name', 'description', 'price')
+            .iterator(chunk_size=chunk_size)
+        )
+        chunk = []
+        for product in products:
+            chunk.append(product)
+            if len(chunk) >= chunk_size:
+                yield from self.render_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self.render_chunk(chunk)
+
+    def render_chunk(self, chunk):
+        images = {}
+        for product_id, image in (ProductImage.objects
+                                  .filter(product_id__in=[row[0] for row in chunk])
+                                  .order_by('id')
+                                  .values_list('product_id', 'image')):
+            images.setdefault(product_id, []).append(str(image))
+        for product_id, name, description, price in chunk:
+            yield {
+                'id': product_id,
+                'name': name,
+                'description': description,
+                'price': str(price),
+                'images': images.get(product_id, []),
+            }
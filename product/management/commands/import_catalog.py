@@ -0,0 +1,132 @@
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from product import cache as catalog_cache
+from product.models import Product, ProductImage
+
+UPDATE_FIELDS = ['name', 'description', 'price', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a catalog file (JSON Lines or CSV) into Product/ProductImage, "
+        "upserting products by id in batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            help="Defaults to the file extension, jsonl for stdin")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.monotonic()
+        total = 0
+        try:
+            rows = self.read_rows(stream, fmt)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch, start=total + 1)
+                total += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{total} rows imported ({total / elapsed:.0f} rows/s)")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # batches committed before a failing row stay imported: keep the
+            # sequences and the catalog cache in step with them either way
+            self.reset_sequences()
+            catalog_cache.bump_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {total} products in {elapsed:.2f}s "
+            f"({total / elapsed if elapsed else total:.0f} rows/s)"))
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            for row in csv.DictReader(stream):
+                images = row.get('images') or ''
+                row['images'] = [image for image in images.split('|') if image]
+                yield row
+            return
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise CommandError(f"Line {line_no}: invalid JSON ({exc})")
+
+    def build_product(self, row, line_no):
+        try:
+            price = Decimal(str(row['price']))
+            return Product(
+                id=int(row['id']) if row.get('id') not in (None, '') else None,
+                name=row['name'],
+                description=row.get('description') or '',
+                price=price,
+            )
+        except (KeyError, ValueError, InvalidOperation) as exc:
+            raise CommandError(f"Row {line_no}: invalid product ({exc!r})")
+
+    def import_batch(self, rows, start):
+        products = [self.build_product(row, start + i) for i, row in enumerate(rows)]
+        with transaction.atomic():
+            existing = [p for p in products if p.id is not None]
+            new = [p for p in products if p.id is None]
+            if existing:
+                Product.objects.bulk_create(
+                    existing,
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=UPDATE_FIELDS,
+                )
+            if new:
+                Product.objects.bulk_create(new)
+            self.attach_images(products, rows)
+
+    def attach_images(self, products, rows):
+        wanted = {
+            (product.id, str(image))
+            for product, row in zip(products, rows)
+            for image in row.get('images') or []
+        }
+        if not wanted:
+            return
+        present = {
+            (product_id, str(image)) for product_id, image in
+            ProductImage.objects
+            .filter(product_id__in={product_id for product_id, _ in wanted})
+            .values_list('product_id', 'image')
+        }
+        ProductImage.objects.bulk_create([
+            ProductImage(product_id=product_id, image=image)
+            for product_id, image in sorted(wanted - present)
+        ])
+
+    def reset_sequences(self):
+        # explicit ids don't advance the primary key sequence on PostgreSQL
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Product, ProductImage])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
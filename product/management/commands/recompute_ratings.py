@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from product.services import ProductRatingService
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating aggregates of every product from its reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = ProductRatingService.recompute(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed ratings for {updated} reviewed products"))
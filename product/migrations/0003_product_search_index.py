@@ -0,0 +1,92 @@
+# Full-text search index for Product.name / Product.description.
+#
+# PostgreSQL gets a stored, generated tsvector column with a GIN index, so the
+# database keeps it in sync on every insert/update (including bulk writes).
+# SQLite gets an external-content FTS5 table kept in sync by triggers.
+
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE product_product
+    ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX product_search_vector_gin ON product_product USING gin (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS product_search_vector_gin",
+    "ALTER TABLE product_product DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE product_product_fts USING fts5(
+        name, description, content='product_product', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER product_product_fts_ai AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_product_fts_ad AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_product_fts(product_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_product_fts_au AFTER UPDATE ON product_product BEGIN
+        INSERT INTO product_product_fts(product_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO product_product_fts(product_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS product_product_fts_au",
+    "DROP TRIGGER IF EXISTS product_product_fts_ad",
+    "DROP TRIGGER IF EXISTS product_product_fts_ai",
+    "DROP TABLE IF EXISTS product_product_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
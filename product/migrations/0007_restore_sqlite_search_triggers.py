@@ -0,0 +1,62 @@
+# Restores the SQLite full-text sync triggers of 0003_product_search_index.
+#
+# SQLite rebuilds product_product for the rating columns added in
+# 0005_product_rating_aggregates and drops the table's triggers with it, so
+# product_product_fts stopped following inserts, updates and deletes. The
+# update trigger now only fires for name/description changes, not for the
+# rating aggregate updates every review write makes. Any later migration that
+# rebuilds product_product on SQLite has to restore the triggers again.
+# PostgreSQL keeps its generated search_vector column, nothing to do there.
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_product_fts USING fts5(
+        name, description, content='product_product', content_rowid='id'
+    )
+    """,
+    "DROP TRIGGER IF EXISTS product_product_fts_ai",
+    "DROP TRIGGER IF EXISTS product_product_fts_ad",
+    "DROP TRIGGER IF EXISTS product_product_fts_au",
+    """
+    CREATE TRIGGER product_product_fts_ai AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_product_fts_ad AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_product_fts(product_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_product_fts_au AFTER UPDATE OF name, description ON product_product BEGIN
+        INSERT INTO product_product_fts(product_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    # rows written while the triggers were missing
+    "INSERT INTO product_product_fts(product_product_fts) VALUES ('rebuild')",
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_productimage_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -12,8 +12,22 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # rating aggregates, maintained from Review writes by ProductRatingService
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['-id',]
+        indexes = [
+            models.Index(fields=['-rating_average'], name='product_rating_avg_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -23,6 +37,7 @@ class ProductImage(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField('image')
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class Review(models.Model):
@@ -35,6 +50,11 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-id'], name='review_product_id_idx'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user.first_name} on {self.product.name}"
     
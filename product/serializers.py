@@ -17,7 +17,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'price_with_tax', 'images']  # other
+        fields = ['id', 'name', 'description', 'price', 'price_with_tax',
+                  'rating_count', 'rating_average', 'images']  # other
 
     price_with_tax = serializers.SerializerMethodField(
         method_name='calculate_tax')
@@ -44,17 +45,14 @@ class SimpleUserSerializer(serializers.ModelSerializer):
 
 
 class ReviewSerializer(serializers.ModelSerializer):
-    # user = SimpleUserSerializer()
-    user = serializers.SerializerMethodField(method_name='get_user')
+    # one nested serializer shared by every row; the view select_related()s user
+    user = SimpleUserSerializer(read_only=True)
 
     class Meta:
         model = Review
         fields = ['id', 'user', 'product', 'ratings', 'comment']
         read_only_fields = ['user', 'product']
 
-    def get_user(self, obj):
-        return SimpleUserSerializer(obj.user).data
-
     # def create(self, validated_data):
     #     product_id = self.context['product_id']
     #     return Review.objects.create(product_id=product_id, **validated_data)
\ No newline at end of file
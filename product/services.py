@@ -0,0 +1,118 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Now
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+from product import cache as catalog_cache
+from product.models import Product, Review
+
+STARS = range(1, 6)
+
+
+def star_field(star):
+    return f'rating_{star}'
+
+
+class ProductRatingService:
+    @staticmethod
+    def _apply(product_id, count=0, total=0, stars=None):
+        """
+        Shift the rating aggregates of a product in one UPDATE. All the
+        right-hand sides read the pre-update row, so the average is computed
+        from the new count/sum in the same statement. It divides as floats:
+        SQLite's CAST AS NUMERIC keeps integers, which would divide as integers.
+        """
+        new_count = F('rating_count') + count
+        new_sum = F('rating_sum') + total
+        updates = {
+            'rating_count': new_count,
+            'rating_sum': new_sum,
+            'rating_average': Case(
+                When(GreaterThan(new_count, 0), then=Cast(
+                    Cast(new_sum, FloatField()) / Cast(new_count, FloatField()),
+                    DecimalField(max_digits=3, decimal_places=2),
+                )),
+                default=Value(0),
+                output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+            'updated_at': Now(),
+        }
+        for star, delta in (stars or {}).items():
+            field = star_field(star)
+            updates[field] = F(field) + delta
+        Product.objects.filter(pk=product_id).update(**updates)
+
+    @staticmethod
+    def review_added(product_id, ratings):
+        ProductRatingService._apply(
+            product_id, count=1, total=ratings, stars={ratings: 1})
+
+    @staticmethod
+    def review_removed(product_id, ratings):
+        ProductRatingService._apply(
+            product_id, count=-1, total=-ratings, stars={ratings: -1})
+
+    @staticmethod
+    def review_changed(product_id, old_ratings, new_ratings):
+        if old_ratings == new_ratings:
+            return
+        ProductRatingService._apply(
+            product_id, total=new_ratings - old_ratings,
+            stars={old_ratings: -1, new_ratings: 1})
+
+    @staticmethod
+    def summary(product):
+        return {
+            'count': product.rating_count,
+            'average': product.rating_average,
+            'histogram': {
+                str(star): getattr(product, star_field(star)) for star in STARS
+            },
+        }
+
+    @staticmethod
+    def recompute(batch_size=1000):
+        """Rebuild every product's rating aggregates from the Review table."""
+        stats = (
+            Review.objects
+            .order_by()
+            .values('product_id')
+            .annotate(
+                count=Count('id'),
+                total=Sum('ratings'),
+                **{star_field(star): Count('id', filter=Q(ratings=star))
+                   for star in STARS},
+            )
+        )
+        fields = ['rating_count', 'rating_sum', 'rating_average', 'updated_at'] + \
+            [star_field(star) for star in STARS]
+
+        with transaction.atomic():
+            # updated_at moves too, so ETag / Last-Modified follow the new ratings
+            now = timezone.now()
+            Product.objects.filter(rating_count__gt=0).update(
+                rating_count=0, rating_sum=0, rating_average=0, updated_at=now,
+                **{star_field(star): 0 for star in STARS})
+
+            batch = []
+            updated = 0
+            for row in stats.iterator(chunk_size=batch_size):
+                product = Product(
+                    pk=row['product_id'],
+                    rating_count=row['count'],
+                    rating_sum=row['total'],
+                    rating_average=(Decimal(row['total']) / row['count']).quantize(Decimal('0.01')),
+                    updated_at=now,
+                    **{star_field(star): row[star_field(star)] for star in STARS},
+                )
+                batch.append(product)
+                if len(batch) >= batch_size:
+                    Product.objects.bulk_update(batch, fields)
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                Product.objects.bulk_update(batch, fields)
+                updated += len(batch)
+            transaction.on_commit(catalog_cache.bump_version)
+        return updated
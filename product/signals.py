@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.db.models.functions import Now
+from django.dispatch import receiver
+from product import cache as catalog_cache
+from product.models import Product, ProductImage, Review
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    # bump after commit so a concurrent reader can't re-cache the old rows
+    transaction.on_commit(catalog_cache.bump_version)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def touch_product(sender, instance, **kwargs):
+    # product representations embed their images; keep Last-Modified honest
+    Product.objects.filter(pk=instance.product_id).update(updated_at=Now())
@@ -1,3 +1,383 @@
+import json
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Avg, Count, Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from product import cache as catalog_cache
+from product.filters import ProductSearchFilter
+from product.models import Product, ProductImage, Review
+from product.serializers import ProductSerializer
+from product.services import ProductRatingService
+from users.models import User
 
-# Create your tests here.
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def make_products(self, count, **fields):
+        return [Product.objects.create(
+                    name=f"Product {i}", description=f"Description {i}",
+                    price=Decimal('10.00') + i, **fields)
+                for i in range(count)]
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    def test_cursor_pages_follow_the_key(self):
+        products = self.make_products(3)
+        response = self.client.get('/api/v1/products/?pagination=cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [product.id for product in reversed(products)])
+
+    def test_cursor_refused_with_search_or_ordering(self):
+        self.make_products(3)
+        for query in ('search=product', 'ordering=price'):
+            response = self.client.get(f'/api/v1/products/?pagination=cursor&{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(query.split('=')[0], response.data)
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        products = self.make_products(95)
+        url, seen, costs = '/api/v1/products/?pagination=cursor', [], []
+        while url:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.data['results']]
+            costs.append(len(queries))
+            for query in queries.captured_queries:
+                # no paginator count and no offset walking past earlier pages
+                self.assertNotIn('__count', query['sql'])
+                self.assertNotIn('OFFSET', query['sql'])
+            url = response.data['next']
+        self.assertEqual(seen, [product.id for product in reversed(products)])
+        self.assertEqual(len(costs), 10)
+        self.assertEqual(set(costs), {costs[0]})
+
+
+class SearchTests(CatalogTestCase):
+    def search(self, term):
+        response = self.client.get(f'/api/v1/products/?search={term}')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_index_follows_writes(self):
+        product = Product.objects.create(
+            name="Wheelchair", description="Folding frame", price=Decimal('120.00'))
+        self.assertEqual(self.search('wheel'), [product.id])
+
+        product.name = "Walker"
+        product.save()
+        cache.clear()
+        self.assertEqual(self.search('wheel'), [])
+        self.assertEqual(self.search('walk'), [product.id])
+
+        product.delete()
+        cache.clear()
+        self.assertEqual(self.search('walk'), [])
+
+    def test_query_count_does_not_grow_with_the_catalog(self):
+        for count in (10, 300):
+            self.make_products(count - Product.objects.count())
+            cache.clear()
+            # conditional GET validators, page count, the page, its images
+            with self.assertNumQueries(4):
+                response = self.client.get('/api/v1/products/?search=prod')
+            self.assertEqual(response.data['count'], count)
+
+    def test_search_reads_the_index_not_the_table(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("checks the SQLite FTS5 plan")
+        request = Request(APIRequestFactory().get('/', {'search': 'wheel chair'}))
+        queryset = ProductSearchFilter().filter_queryset(request, Product.objects.all(), None)
+        plan = queryset.explain()
+        self.assertIn('SEARCH product_product USING INTEGER PRIMARY KEY', plan)
+        self.assertIn('SCAN product_product_fts VIRTUAL TABLE', plan)
+        self.assertNotRegex(plan, r'SCAN product_product(?!_fts)')
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product, = self.make_products(1)
+
+    def assertNotModified(self, url, etag):
+        with mock.patch.object(ProductSerializer, 'to_representation') as to_representation, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        to_representation.assert_not_called()
+        self.assertLessEqual(len(queries), 1)
+
+    def test_not_modified_skips_serializer(self):
+        for url in ('/api/v1/products/', f'/api/v1/products/{self.product.pk}/'):
+            etag = self.client.get(url)['ETag']
+            self.assertNotModified(url, etag)
+            # validators computed again on a cold cache: one aggregate query
+            cache.clear()
+            self.assertNotModified(url, etag)
+
+    def test_malformed_id_is_not_found(self):
+        self.assertEqual(self.client.get('/api/v1/products/abc/').status_code, 404)
+
+    def test_etag_changes_after_write(self):
+        url = f'/api/v1/products/{self.product.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('99.00')
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['price'], Decimal('99.00'))
+
+    def test_etag_changes_after_rating_recompute(self):
+        url = f'/api/v1/products/{self.product.pk}/'
+        user = User.objects.create_user(email='reviewer@example.com', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            # written without the service, so the aggregates are stale
+            Review.objects.create(product=self.product, user=user, ratings=4, comment='ok')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductRatingService.recompute()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rating_count'], 1)
+
+
+class ImportCatalogTests(CatalogTestCase):
+    def import_lines(self, lines, batch_size=2):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as catalog:
+            catalog.write('\n'.join(lines) + '\n')
+            catalog.flush()
+            call_command('import_catalog', catalog.name, batch_size=batch_size, stdout=mock.Mock())
+
+    def row(self, pk, price='10.00'):
+        return json.dumps({'id': pk, 'name': f"Imported {pk}", 'price': price})
+
+    def test_failed_batch_keeps_cache_in_step(self):
+        version = catalog_cache.get_version()
+        with self.assertRaisesMessage(CommandError, 'Row 3'):
+            self.import_lines([self.row(101), self.row(102), self.row(103, price='n/a')])
+        self.assertEqual(set(Product.objects.values_list('pk', flat=True)), {101, 102})
+        self.assertNotEqual(catalog_cache.get_version(), version)
+        self.assertGreater(Product.objects.create(name='New', description='', price=1).pk, 102)
+
+    def test_malformed_json_reports_line(self):
+        with self.assertRaisesMessage(CommandError, 'Line 3: invalid JSON'):
+            self.import_lines([self.row(101), '', '{"id": 102,'])
+
+
+class BundleTests(CatalogTestCase):
+    def test_query_budget(self):
+        product, = self.make_products(1)
+        for i in range(3):
+            ProductImage.objects.create(product=product, image=f'sample-{i}')
+        for i in range(15):
+            user = User.objects.create(email=f'user{i}@example.com')
+            Review.objects.create(product=product, user=user, ratings=5, comment='good')
+            ProductRatingService.review_added(product.pk, 5)
+
+        # product, its images, one page of reviews with their authors
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/v1/products/{product.pk}/bundle/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['images']), 3)
+        self.assertEqual(response.data['reviews']['count'], 15)
+        self.assertEqual(len(response.data['reviews']['results']), 10)
+        self.assertIsNotNone(response.data['reviews']['next'])
+
+
+class ReviewListTests(CatalogTestCase):
+    def test_query_count_does_not_grow_with_reviews(self):
+        product, = self.make_products(1)
+        url = f'/api/v1/products/{product.pk}/reviews/'
+        for count in (3, 10):
+            for i in range(count - Review.objects.count()):
+                user = User.objects.create(email=f'user{count}-{i}@example.com')
+                Review.objects.create(product=product, user=user, ratings=4, comment='fine')
+            cache.clear()
+            # conditional GET validators, page count, the page with its authors
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+
+class BatchTests(CatalogTestCase):
+    def test_results_in_requested_order(self):
+        first, second = self.make_products(2)
+        response = self.client.get(f'/api/v1/products/batch/?ids={second.pk},999,{first.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [second.pk, first.pk])
+        self.assertEqual(response.data['missing'], [999])
+
+    def test_invalid_ids_are_rejected(self):
+        too_many = ','.join(str(pk) for pk in range(1, 302))
+        for ids in ('99999999999999999999999', '-99999999999999999999999', 'abc', '', too_many):
+            response = self.client.get(f'/api/v1/products/batch/?ids={ids}')
+            self.assertEqual(response.status_code, 400, ids[:30])
+
+
+class FacetTests(CatalogTestCase):
+    def test_counts_per_price_bucket(self):
+        self.make_products(3)   # priced 10, 11 and 12
+        response = self.client.get('/api/v1/products/facets/?price_buckets=0,11')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bucket['count'] for bucket in response.data['price']], [1, 2])
+
+    def test_invalid_bounds_are_rejected(self):
+        for bounds in ('0,nan', '0,Infinity', '-Infinity,0', '1e999999999', '100000000',
+                       'abc', '5,1'):
+            response = self.client.get(f'/api/v1/products/facets/?price_buckets={bounds}')
+            self.assertEqual(response.status_code, 400, bounds)
+            self.assertIn('price_buckets', response.data)
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product, = self.make_products(1)
+        self.url = f'/api/v1/products/{self.product.pk}/'
+
+    def test_responses_are_served_from_the_cache(self):
+        for url in ('/api/v1/products/', self.url):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.data, first.data)
+
+    def test_hit_and_miss_counters(self):
+        catalog_cache.reset_stats()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.get(self.url)
+        stats = catalog_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (2, 1, 0.6667))
+
+        staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.get('/api/v1/products/cache_stats/').data['hits'], 2)
+
+    def test_writes_bump_the_version(self):
+        user = User.objects.create_user(email='reviewer@example.com', password='x')
+        writes = [
+            lambda: Product.objects.filter(pk=self.product.pk).first().save(),
+            lambda: ProductImage.objects.create(product=self.product, image='walker.png'),
+            lambda: Review.objects.create(product=self.product, user=user, ratings=5, comment='ok'),
+            lambda: Review.objects.all().delete(),
+        ]
+        for write in writes:
+            version = catalog_cache.get_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(catalog_cache.get_version(), version)
+
+    def test_write_is_visible_after_commit(self):
+        self.assertEqual(self.client.get(self.url).data['name'], 'Product 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Walker'
+            self.product.save()
+        self.assertEqual(self.client.get(self.url).data['name'], 'Walker')
+
+
+class StampedeTests(CatalogTestCase):
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return 'payload', True
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+                       catalog_cache.get_or_build('catalog:test', build)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['payload'] * 5)
+        self.assertEqual(len(builds), 1)
+
+    @mock.patch.object(catalog_cache, 'LOCK_POLL_INTERVAL', 0.01)
+    def test_waiter_builds_itself_when_the_holder_gives_up(self):
+        cache.add('catalog:test:lock', 1, catalog_cache.LOCK_TIMEOUT)
+        threading.Timer(0.05, cache.delete, ['catalog:test:lock']).start()
+        build = mock.Mock(return_value=('fresh', True))
+        self.assertEqual(catalog_cache.get_or_build('catalog:test', build), 'fresh')
+        build.assert_called_once()
+
+    def test_uncacheable_payloads_are_not_stored(self):
+        build = mock.Mock(return_value=('error', False))
+        catalog_cache.get_or_build('catalog:test', build)
+        catalog_cache.get_or_build('catalog:test', build)
+        self.assertEqual(build.call_count, 2)
+        self.assertIsNone(cache.get('catalog:test:lock'))
+
+
+class ReviewAggregateTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product, = self.make_products(1)
+        self.url = f'/api/v1/products/{self.product.pk}/reviews/'
+        self.users = [User.objects.create_user(email=f'reviewer{i}@example.com', password='x')
+                      for i in range(3)]
+
+    def as_user(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def assertAggregatesMatch(self):
+        product = Product.objects.get(pk=self.product.pk)
+        reviews = Review.objects.filter(product=product)
+        expected = reviews.aggregate(count=Count('pk'), total=Sum('ratings'), average=Avg('ratings'))
+        self.assertEqual(product.rating_count, expected['count'])
+        self.assertEqual(product.rating_sum, expected['total'] or 0)
+        self.assertAlmostEqual(float(product.rating_average), expected['average'] or 0, places=2)
+        for star in range(1, 6):
+            self.assertEqual(getattr(product, f'rating_{star}'),
+                             reviews.filter(ratings=star).count(), star)
+
+    def test_aggregates_follow_create_update_and_delete(self):
+        ids = []
+        for user, ratings in zip(self.users, (5, 4, 2)):
+            response = self.as_user(user).post(self.url, {'ratings': ratings, 'comment': 'ok'})
+            self.assertEqual(response.status_code, 201)
+            ids.append(response.data['id'])
+            self.assertAggregatesMatch()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).rating_average, Decimal('3.67'))
+
+        response = self.as_user(self.users[2]).patch(f'{self.url}{ids[2]}/', {'ratings': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertAggregatesMatch()
+        # unchanged rating: nothing moves
+        self.as_user(self.users[2]).patch(f'{self.url}{ids[2]}/', {'comment': 'great'})
+        self.assertAggregatesMatch()
+
+        for user, review_id in zip(self.users, ids):
+            response = self.as_user(user).delete(f'{self.url}{review_id}/')
+            self.assertEqual(response.status_code, 204)
+            self.assertAggregatesMatch()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).rating_average, 0)
+
+    def test_other_users_review_is_left_alone(self):
+        response = self.as_user(self.users[0]).post(self.url, {'ratings': 5, 'comment': 'ok'})
+        review_url = f'{self.url}{response.data["id"]}/'
+        self.assertEqual(self.as_user(self.users[1]).patch(review_url, {'ratings': 1}).status_code, 403)
+        self.assertEqual(self.as_user(self.users[1]).delete(review_url).status_code, 403)
+        self.assertAggregatesMatch()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).rating_5, 1)
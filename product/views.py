@@ -1,30 +1,47 @@
-from django.forms import ValidationError
+from django.db import connection, transaction
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from product.models import Product, Review, ProductImage
 from product.serializers import ProductSerializer, ReviewSerializer, ProductImageSerializer
-from django.db.models import Count
+from decimal import Decimal, InvalidOperation
+from django.db.models import Count, Q
 from rest_framework.viewsets import ModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
-from product.filters import ProductFilter
-from rest_framework.filters import SearchFilter, OrderingFilter
+from product.filters import ProductFilter, ProductSearchFilter
+from rest_framework.filters import OrderingFilter
+from api.mixins import ConditionalGetMixin
 from api.permissions import IsAdminOrReadOnly
+from product import cache as catalog_cache
+from rest_framework.permissions import IsAdminUser
 from product.permissions import IsReviewAuthorOrReadonly
+from product.services import ProductRatingService
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, ModelViewSet):
     """
     API endpoint for managing products in the e-commerce store
      - Allows authenticated admin to create, update, and delete products
      - Allows users to browse and filter product
-     - Support searching by name, description, and category
-     - Support ordering by price and updated_at
+     - Support ranked full-text (prefix) search by name and description
+     - Support filtering and ordering by price, rating and updated_at
+     - Support keyset pagination with `?pagination=cursor`
+     - List and detail responses are served from a versioned cache
+     - Support conditional GET (ETag / Last-Modified)
     """
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['name', 'description']
-    ordering_fields = ['price', 'updated_at']
+    ordering_fields = ['price', 'updated_at', 'rating_average', 'rating_count']
+    cursor_ordering = '-id'
+    conditional_version = staticmethod(catalog_cache.get_version)
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
@@ -37,6 +54,174 @@ class ProductViewSet(ModelViewSet):
         """Retrive all the Services"""
         return super().list(request, *args, **kwargs)
 
+    def list_response(self, request, *args, **kwargs):
+        return catalog_cache.cached_response(
+            request, 'list', lambda: super(ProductViewSet, self).list_response(request, *args, **kwargs))
+
+    def retrieve_response(self, request, *args, **kwargs):
+        return catalog_cache.cached_response(
+            request, 'detail', lambda: super(ProductViewSet, self).retrieve_response(request, *args, **kwargs))
+
+    @swagger_auto_schema(
+        operation_summary='Retrive a product with its images, rating summary and first page of reviews'
+    )
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        """
+        Everything the service detail page needs in one response, built with a
+        fixed number of queries: product, images, first page of reviews (with
+        their authors). Review count and summary come from the product row.
+        """
+        return catalog_cache.cached_response(
+            request, 'bundle', lambda: self.bundle_response(request))
+
+    def bundle_response(self, request):
+        product = self.get_object()
+        page_size = api_settings.PAGE_SIZE
+        reviews = (Review.objects
+                   .filter(product=product)
+                   .select_related('user')
+                   .order_by('-id')[:page_size])
+
+        next_page = None
+        if product.rating_count > page_size:
+            reviews_url = reverse('product-review-list',
+                                  kwargs={'product__pk': product.pk})
+            next_page = request.build_absolute_uri(f"{reviews_url}?page=2")
+
+        data = self.get_serializer(product).data
+        data['rating_summary'] = ProductRatingService.summary(product)
+        data['reviews'] = {
+            'count': product.rating_count,
+            'next': next_page,
+            'results': ReviewSerializer(
+                reviews, many=True, context={'request': request}).data,
+        }
+        return Response(data)
+
+    batch_max_ids = 300
+
+    @swagger_auto_schema(
+        operation_summary='Retrive many products by id in one request',
+        manual_parameters=[openapi.Parameter(
+            'ids', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+            description='Comma separated product ids (at most 300)')],
+    )
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Products for a cart or saved list, in the requested order, with the ids
+        that don't exist listed under `missing`. Products are cached one by one
+        in the catalog cache, so warm lookups don't touch the database.
+        """
+        raw_ids = [pk for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+        if len(set(raw_ids)) > self.batch_max_ids:
+            return Response({"ids": f"At most {self.batch_max_ids} ids are allowed"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(pk) for pk in raw_ids]
+        except ValueError:
+            return Response({"ids": "Expected a comma separated list of integers"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return Response({"ids": "This query parameter is required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # out of range ids would overflow the database driver
+        low, high = connection.ops.integer_field_range(Product._meta.pk.get_internal_type())
+        if any(not low <= pk <= high for pk in ids):
+            return Response({"ids": f"Ids must be between {low} and {high}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        def build(missing):
+            products = Product.objects.prefetch_related('images').filter(id__in=missing)
+            return {item['id']: dict(item)
+                    for item in self.get_serializer(products, many=True).data}
+
+        found = catalog_cache.get_many('product', ids, build)
+        return Response({
+            'results': [found[pk] for pk in ids if pk in found],
+            'missing': [pk for pk in ids if pk not in found],
+        })
+
+    facet_price_buckets = [0, 50, 100, 200, 500]
+    facet_max_price_buckets = 20
+    facet_rating_bands = [4, 3, 2, 1]
+
+    @swagger_auto_schema(
+        operation_summary='Count products per price bucket and rating band',
+        manual_parameters=[openapi.Parameter(
+            'price_buckets', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Ascending, comma separated bucket lower bounds (default 0,50,100,200,500)')],
+    )
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Price bucket and rating band counts for the same filtered/searched
+        products the list returns, computed in one conditional aggregate query
+        """
+        bounds = self.get_price_buckets(request)
+        return catalog_cache.cached_response(
+            request, 'facets', lambda: self.facets_response(bounds))
+
+    def get_price_buckets(self, request):
+        raw = request.query_params.get('price_buckets')
+        if not raw:
+            return [Decimal(bound) for bound in self.facet_price_buckets]
+
+        def invalid(message):
+            return ValidationError({"price_buckets": message})
+
+        try:
+            bounds = [Decimal(bound) for bound in raw.split(',') if bound.strip()]
+        except InvalidOperation:
+            raise invalid("Expected a comma separated list of numbers")
+        if not bounds or len(bounds) > self.facet_max_price_buckets:
+            raise invalid(f"Expected 1 to {self.facet_max_price_buckets} bounds")
+        # bounds are compared with Product.price, so they must fit its column
+        price = Product._meta.get_field('price')
+        limit = Decimal(10) ** (price.max_digits - price.decimal_places)
+        if any(not bound.is_finite() or not -limit < bound < limit for bound in bounds):
+            raise invalid(f"Bounds must be finite numbers between -{limit} and {limit}")
+        if any(low >= high for low, high in zip(bounds, bounds[1:])):
+            raise invalid("Bounds must be in ascending order")
+        return bounds
+
+    def facets_response(self, bounds):
+        queryset = self.filter_queryset(self.get_queryset())
+        ranges = list(zip(bounds, bounds[1:] + [None]))
+
+        aggregates = {'total': Count('pk')}
+        for i, (low, high) in enumerate(ranges):
+            condition = Q(price__gte=low)
+            if high is not None:
+                condition &= Q(price__lt=high)
+            aggregates[f'price_{i}'] = Count('pk', filter=condition)
+        for band in self.facet_rating_bands:
+            aggregates[f'rating_{band}'] = Count(
+                'pk', filter=Q(rating_count__gt=0, rating_average__gte=band))
+        aggregates['rating_none'] = Count('pk', filter=Q(rating_count=0))
+
+        counts = queryset.order_by().aggregate(**aggregates)
+        return Response({
+            'count': counts['total'],
+            'price': [
+                {'min': low, 'max': high, 'count': counts[f'price_{i}']}
+                for i, (low, high) in enumerate(ranges)
+            ],
+            'rating': [
+                {'min': band, 'count': counts[f'rating_{band}']}
+                for band in self.facet_rating_bands
+            ] + [{'min': None, 'count': counts['rating_none']}],
+        })
+
+    @swagger_auto_schema(
+        operation_summary='Catalog cache hit/miss counters (admin only)'
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(catalog_cache.stats())
+
     @swagger_auto_schema(
         operation_summary="Create a product by admin",
         operation_description="This allow an admin to create a product",
@@ -51,9 +236,10 @@ class ProductViewSet(ModelViewSet):
         return super().create(request, *args, **kwargs)
 
 
-class ProductImageViewSet(ModelViewSet):
+class ProductImageViewSet(ConditionalGetMixin, ModelViewSet):
     serializer_class = ProductImageSerializer
     permission_classes = [IsAdminOrReadOnly]
+    conditional_version = staticmethod(catalog_cache.get_version)
 
     def _product_id(self):
         return (
@@ -74,9 +260,11 @@ class ProductImageViewSet(ModelViewSet):
         serializer.save(product_id=pid)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(ConditionalGetMixin, ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [IsReviewAuthorOrReadonly]
+    cursor_ordering = '-id'
+    conditional_version = staticmethod(catalog_cache.get_version)
 
     def _product_id(self):
         return (
@@ -87,13 +275,41 @@ class ReviewViewSet(ModelViewSet):
 
     def get_queryset(self):
         pid = self._product_id()
-        return Review.objects.filter(product_id=pid) if pid else Review.objects.none()
+        if not pid:
+            return Review.objects.none()
+        return (Review.objects
+                .filter(product_id=pid)
+                .select_related('user')
+                .order_by('-id'))
 
     def get_serializer_context(self):
         return {"product_id": self._product_id()}
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request, *args, **kwargs):
+        """Rating count, average and 1-5 star histogram of the product"""
+        product = get_object_or_404(Product, pk=self._product_id())
+        return Response(ProductRatingService.summary(product))
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user, product_id=self._product_id())
+        with transaction.atomic():
+            review = serializer.save(
+                user=self.request.user, product_id=self._product_id())
+            ProductRatingService.review_added(review.product_id, review.ratings)
 
     def perform_update(self, serializer):
-        serializer.save(user=self.request.user, product_id=self._product_id())
\ No newline at end of file
+        with transaction.atomic():
+            old_ratings = (Review.objects.select_for_update()
+                           .values_list('ratings', flat=True)
+                           .get(pk=serializer.instance.pk))
+            review = serializer.save(
+                user=self.request.user, product_id=self._product_id())
+            ProductRatingService.review_changed(
+                review.product_id, old_ratings, review.ratings)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            deleted, _ = Review.objects.filter(pk=instance.pk).delete()
+            if deleted:
+                ProductRatingService.review_removed(
+                    instance.product_id, instance.ratings)
\ No newline at end of file
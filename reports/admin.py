@@ -0,0 +1,16 @@
+from django.contrib import admin
+from reports.models import DailySales, DailyProductSales
+
+# Register your models here.
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'status', 'order_count', 'revenue']
+    list_filter = ['status']
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'status', 'units', 'revenue']
+    list_filter = ['status']
@@ -0,0 +1,34 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from reports.services import SalesRollupService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups from the order history, a few days per transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help="First day to rebuild (YYYY-MM-DD, default: first order)")
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help="Last day to rebuild (YYYY-MM-DD, default: last order)")
+        parser.add_argument('--chunk-days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        first, last = SalesRollupService.history_range()
+        start = options['start'] or first
+        end = options['end'] or last
+        if start is None or end is None:
+            self.stdout.write("No orders, nothing to backfill")
+            return
+        if start > end:
+            raise CommandError("--start must not be after --end")
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1")
+
+        total = 0
+        for chunk_start, chunk_end, orders in SalesRollupService.rebuild(
+                start, end, chunk_days=options['chunk_days']):
+            total += orders
+            self.stdout.write(f"{chunk_start}..{chunk_end}: {orders} orders")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups for {start}..{end} from {total} orders"))
@@ -0,0 +1,42 @@
+from django.db import models
+from django.db.models import UniqueConstraint
+from order.models import Order
+from product.models import Product
+# Create your models here.
+
+
+class DailySales(models.Model):
+    """Orders placed on `date` that are currently in `status`"""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+        constraints = [
+            UniqueConstraint(fields=['date', 'status'], name='uniq_daily_sales')
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count} orders"
+
+
+class DailyProductSales(models.Model):
+    """Units of a product in orders placed on `date` that are currently in `status`"""
+    date = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='daily_sales')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily product sales'
+        constraints = [
+            UniqueConstraint(fields=['date', 'product', 'status'],
+                             name='uniq_daily_product_sales')
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} {self.status}: {self.units} units"
@@ -0,0 +1,63 @@
+from rest_framework import serializers
+from order.models import Order
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    max_days = 731
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    status = serializers.CharField(required=False, help_text="Comma separated order statuses")
+    top = serializers.IntegerField(required=False, default=10, min_value=0, max_value=100)
+
+    def validate_status(self, value):
+        valid = {choice for choice, _ in Order.STATUS_CHOICES}
+        statuses = list(dict.fromkeys(s.strip() for s in value.split(',') if s.strip()))
+        invalid = [s for s in statuses if s not in valid]
+        if invalid:
+            raise serializers.ValidationError(f"Unknown status: {', '.join(invalid)}")
+        return statuses
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({"end": "Must not be before start"})
+        if (attrs['end'] - attrs['start']).days >= self.max_days:
+            raise serializers.ValidationError(
+                {"end": f"At most {self.max_days} days can be reported at once"})
+        return attrs
+
+
+class SalesByStatusSerializer(serializers.Serializer):
+    status = serializers.CharField()
+    order_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DailySalesSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    order_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class SalesTotalsSerializer(serializers.Serializer):
+    order_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+
+
+class SalesReportSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    statuses = serializers.ListField(child=serializers.CharField())
+    totals = SalesTotalsSerializer()
+    by_status = SalesByStatusSerializer(many=True)
+    daily = DailySalesSerializer(many=True)
+    top_products = ProductSalesSerializer(many=True)
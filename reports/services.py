@@ -0,0 +1,177 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from order.models import Order, OrderItem
+from reports.models import DailySales, DailyProductSales
+
+
+class SalesRollupService:
+    """
+    Keeps the daily rollups in step with the orders. Every order contributes
+    to the row of the day it was placed and its current status, so a status
+    change moves its contribution from one row to another: call
+    `remove_orders` before and `add_orders` after changing orders, in the same
+    transaction.
+    """
+    # statuses that count as sales in reports unless asked otherwise
+    SALE_STATUSES = [Order.PENDING, Order.COMPLETE]
+
+    @staticmethod
+    def add_orders(order_ids):
+        SalesRollupService._apply(order_ids, 1)
+
+    @staticmethod
+    def remove_orders(order_ids):
+        SalesRollupService._apply(order_ids, -1)
+
+    @staticmethod
+    def _order_rows(orders):
+        return (
+            orders
+            .annotate(date=TruncDate('created_at'))
+            .order_by()
+            .values('date', 'status')
+            .annotate(order_count=Count('pk'), revenue=Sum('total_price'))
+        )
+
+    @staticmethod
+    def _product_rows(items):
+        return (
+            items
+            .annotate(date=TruncDate('order__created_at'), status=F('order__status'))
+            .order_by()
+            .values('date', 'product_id', 'status')
+            .annotate(units=Sum('quantity'), revenue=Sum('total_price'))
+        )
+
+    @staticmethod
+    def _apply(order_ids, sign):
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        SalesRollupService._upsert(
+            DailySales, ['date', 'status'], ['order_count', 'revenue'],
+            SalesRollupService._order_rows(Order.objects.filter(pk__in=order_ids)), sign)
+        SalesRollupService._upsert(
+            DailyProductSales, ['date', 'product_id', 'status'], ['units', 'revenue'],
+            SalesRollupService._product_rows(OrderItem.objects.filter(order_id__in=order_ids)),
+            sign)
+
+    @staticmethod
+    def _upsert(model, keys, values, rows, sign):
+        """
+        Add `sign * row` to the rollup rows in one
+        `INSERT ... ON CONFLICT (<keys>) DO UPDATE SET v = v + EXCLUDED.v`,
+        so concurrent changes to the same day never lose updates.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        fields = {name: model._meta.get_field(name) for name in keys + values}
+        columns = keys + values
+        params = []
+        for row in rows:
+            for name in keys:
+                params.append(fields[name].get_db_prep_value(row[name], connection))
+            for name in values:
+                params.append(fields[name].get_db_prep_value(row[name] * sign, connection))
+
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        updates = ', '.join(
+            f"{qn(fields[name].column)} = {table}.{qn(fields[name].column)} + EXCLUDED.{qn(fields[name].column)}"
+            for name in values)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(fields[name].column) for name in columns)}) "
+                f"VALUES {', '.join([placeholders] * len(rows))} "
+                f"ON CONFLICT ({', '.join(qn(fields[name].column) for name in keys)}) "
+                f"DO UPDATE SET {updates}",
+                params)
+
+    @staticmethod
+    def history_range():
+        """First and last day with orders, or (None, None)"""
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            return None, None
+        return (timezone.localdate(bounds['first']), timezone.localdate(bounds['last']))
+
+    @staticmethod
+    def rebuild(start, end, chunk_days=7):
+        """
+        Recompute the rollups of the days `start`..`end` (inclusive) from the
+        order tables, one transaction per `chunk_days` days so each chunk only
+        scans its slice of `order_created_at_idx`. Yields `(chunk_start,
+        chunk_end, orders)` as chunks are committed.
+        """
+        tz = timezone.get_current_timezone()
+        day = start
+        while day <= end:
+            chunk_end = min(day + timedelta(days=chunk_days - 1), end)
+            since = datetime.combine(day, time.min, tzinfo=tz)
+            until = datetime.combine(chunk_end + timedelta(days=1), time.min, tzinfo=tz)
+            with transaction.atomic():
+                DailySales.objects.filter(date__range=(day, chunk_end)).delete()
+                DailyProductSales.objects.filter(date__range=(day, chunk_end)).delete()
+                orders = Order.objects.filter(created_at__gte=since, created_at__lt=until)
+                order_rows = list(SalesRollupService._order_rows(orders))
+                DailySales.objects.bulk_create(
+                    [DailySales(**row) for row in order_rows])
+                DailyProductSales.objects.bulk_create(
+                    [DailyProductSales(**row) for row in SalesRollupService._product_rows(
+                        OrderItem.objects.filter(
+                            order__created_at__gte=since, order__created_at__lt=until))],
+                    batch_size=1000)
+            yield day, chunk_end, sum(row['order_count'] for row in order_rows)
+            day = chunk_end + timedelta(days=1)
+
+    @staticmethod
+    def report(start, end, statuses=None, top_products=10):
+        """
+        Sales between `start` and `end` (inclusive), answered from the rollups
+        only. Totals, the daily series and the top products count orders in
+        `statuses` (SALE_STATUSES by default); `by_status` covers every status.
+        """
+        statuses = statuses or SalesRollupService.SALE_STATUSES
+        days = DailySales.objects.filter(date__range=(start, end))
+        product_days = DailyProductSales.objects.filter(
+            date__range=(start, end), status__in=statuses)
+
+        by_status = list(
+            days.order_by('status').values('status')
+            .annotate(order_count=Sum('order_count'), revenue=Sum('revenue'))
+            .filter(order_count__gt=0))
+        daily = {
+            row['date']: dict(row, units=0) for row in
+            days.filter(status__in=statuses).order_by('date').values('date')
+            .annotate(order_count=Sum('order_count'), revenue=Sum('revenue'))
+            .filter(order_count__gt=0)
+        }
+        for row in product_days.order_by().values('date').annotate(units=Sum('units')):
+            if row['date'] in daily:
+                daily[row['date']]['units'] = row['units']
+        products = list(
+            product_days.values('product_id', name=F('product__name'))
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .filter(units__gt=0)
+            .order_by('-revenue', 'product_id')[:top_products])
+
+        selected = [row for row in by_status if row['status'] in statuses]
+        return {
+            'start': start,
+            'end': end,
+            'statuses': statuses,
+            'totals': {
+                'order_count': sum(row['order_count'] for row in selected),
+                'revenue': sum((row['revenue'] for row in selected), Decimal('0')),
+                'units': sum(row['units'] for row in daily.values()),
+            },
+            'by_status': by_status,
+            'daily': list(daily.values()),
+            'top_products': products,
+        }
@@ -0,0 +1,153 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.management import call_command
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from order.models import Cart, CartItem, Order, OrderItem
+from order.services import OrderService
+from product.models import Product
+from reports.models import DailySales, DailyProductSales
+from users.models import User
+
+
+class SalesRollupTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.cart = Cart.objects.create(user=self.user)
+        self.walker, self.cane = Product.objects.bulk_create([
+            Product(name='Walker', description='', price=Decimal('40.00')),
+            Product(name='Cane', description='', price=Decimal('15.00'))])
+
+    def checkout(self, *lines):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=quantity)
+            for product, quantity in lines])
+        return OrderService.create_order(self.user.pk, self.cart.pk)
+
+    def rollups(self):
+        """Non-empty rollup rows; moved orders leave zeroed rows behind"""
+        return (
+            {(row.date, row.status): (row.order_count, row.revenue)
+             for row in DailySales.objects.exclude(order_count=0)},
+            {(row.date, row.product_id, row.status): (row.units, row.revenue)
+             for row in DailyProductSales.objects.exclude(units=0)},
+        )
+
+    def from_scratch(self):
+        """The same figures aggregated from the order tables"""
+        orders = (Order.objects.annotate(date=TruncDate('created_at')).order_by()
+                  .values('date', 'status')
+                  .annotate(order_count=Count('pk'), revenue=Sum('total_price')))
+        items = (OrderItem.objects
+                 .annotate(date=TruncDate('order__created_at'), status=F('order__status'))
+                 .order_by().values('date', 'product_id', 'status')
+                 .annotate(units=Sum('quantity'), revenue=Sum('total_price')))
+        return (
+            {(row['date'], row['status']): (row['order_count'], row['revenue']) for row in orders},
+            {(row['date'], row['product_id'], row['status']): (row['units'], row['revenue'])
+             for row in items},
+        )
+
+    def assertRollupsMatch(self):
+        self.assertEqual(self.rollups(), self.from_scratch())
+
+
+class IncrementalRollupTests(SalesRollupTestCase):
+    def test_rollups_follow_create_pay_cancel_and_delete(self):
+        first = self.checkout((self.walker, 1), (self.cane, 2))
+        second = self.checkout((self.cane, 1))
+        self.assertRollupsMatch()
+        today = timezone.localdate()
+        self.assertEqual(DailySales.objects.get(date=today, status=Order.UNPAID).order_count, 2)
+
+        OrderService.bulk_update_status([first.pk, second.pk], Order.PENDING)
+        self.assertRollupsMatch()
+        OrderService.set_status(first, Order.COMPLETE)
+        self.assertRollupsMatch()
+        OrderService.cancel_order(second, self.user)
+        self.assertRollupsMatch()
+        self.assertEqual(self.rollups()[0], {
+            (today, Order.COMPLETE): (1, Decimal('70.00')),
+            (today, Order.CANCELED): (1, Decimal('15.00')),
+        })
+
+        OrderService.delete_order(Order.objects.get(pk=second.pk))
+        self.assertRollupsMatch()
+
+    def test_skipped_status_changes_leave_rollups_alone(self):
+        order = self.checkout((self.walker, 1))
+        OrderService.cancel_order(order, self.user)
+        before = self.rollups()
+        # Canceled can't move to Pending: nothing is updated or moved
+        updated, _ = OrderService.bulk_update_status([order.pk], Order.PENDING)
+        self.assertEqual(updated, [])
+        self.assertEqual(self.rollups(), before)
+        self.assertRollupsMatch()
+
+
+class BackfillTests(SalesRollupTestCase):
+    def test_backfill_rebuilds_from_the_order_history(self):
+        orders = [self.checkout((self.walker, i), (self.cane, 1)) for i in range(1, 4)]
+        OrderService.bulk_update_status([orders[0].pk], Order.PENDING)
+        # spread the orders over several days behind the rollups' back
+        now = timezone.now()
+        for days, order in zip((0, 3, 10), orders):
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=days))
+        DailySales.objects.create(date=timezone.localdate(now) - timedelta(days=5),
+                                  status=Order.COMPLETE, order_count=7, revenue=Decimal('1'))
+        self.assertNotEqual(self.rollups(), self.from_scratch())
+
+        call_command('backfill_sales_rollups', chunk_days=2, stdout=mock.Mock())
+        self.assertRollupsMatch()
+        self.assertEqual(len(self.rollups()[0]), 3)
+
+    def test_backfill_without_orders(self):
+        stdout = io.StringIO()
+        call_command('backfill_sales_rollups', stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "No orders, nothing to backfill\n")
+
+
+class SalesReportTests(SalesRollupTestCase):
+    url = '/api/v1/reports/sales/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+
+    def report(self, **params):
+        today = timezone.localdate().isoformat()
+        self.client.force_authenticate(self.staff)
+        return self.client.get(self.url, {'start': today, 'end': today, **params})
+
+    def test_report_counts_sales_statuses(self):
+        paid = self.checkout((self.walker, 2))
+        self.checkout((self.cane, 1))       # still unpaid
+        OrderService.set_status(paid, Order.PENDING)
+
+        response = self.report()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'],
+                         {'order_count': 1, 'revenue': Decimal('80.00'), 'units': 2})
+        self.assertEqual([row['product_id'] for row in response.data['top_products']],
+                         [self.walker.pk])
+        self.assertEqual({row['status']: row['order_count'] for row in response.data['by_status']},
+                         {Order.PENDING: 1, Order.UNPAID: 1})
+
+        response = self.report(status=Order.UNPAID)
+        self.assertEqual(response.data['totals']['revenue'], Decimal('15.00'))
+
+    def test_report_reads_rollups_only(self):
+        self.checkout((self.walker, 1))
+        # by status, daily orders, daily units, top products
+        with self.assertNumQueries(4):
+            self.report()
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -0,0 +1,29 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from reports.serializers import SalesReportQuerySerializer, SalesReportSerializer
+from reports.services import SalesRollupService
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_summary='Sales for a date range, from the daily rollups',
+    query_serializer=SalesReportQuerySerializer,
+    responses={200: SalesReportSerializer},
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_report(request):
+    """
+    Revenue, order count and units per day, the status breakdown and the top
+    products between `start` and `end` (inclusive, YYYY-MM-DD). `status`
+    selects the statuses counted as sales (default: Pending,Complete).
+    """
+    query = SalesReportQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    report = SalesRollupService.report(
+        params['start'], params['end'],
+        statuses=params.get('status'), top_products=params['top'])
+    return Response(SalesReportSerializer(report).data)
@@ -36,6 +36,16 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # a user built from the cached snapshot (api/authentication.py) loads
+        # all of its deferred fields on the first access, not one per query
+        if fields is not None:
+            fields = set(fields)
+            deferred = self.get_deferred_fields()
+            if fields & deferred:
+                fields |= deferred
+        super().refresh_from_db(using, fields, **kwargs)
+
     def __str__(self):
         return self.email if self.email else f"User(id={self.id})"
 
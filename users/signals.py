@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from api.authentication import forget_user
+from users.models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # profile, role, is_active and password changes must reach authentication
+    user_id = instance.pk
+    forget_user(user_id)
+    # again after commit, so a request that re-cached the old row in between
+    # doesn't keep it until the entry expires
+    transaction.on_commit(lambda: forget_user(user_id))
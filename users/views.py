@@ -31,6 +31,8 @@ class UserViewSet(viewsets.ModelViewSet):
         return [drf_permissions.IsAuthenticated()]
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return User.objects.none()
         user = self.request.user
         if user.is_authenticated and (user.is_staff or getattr(user, "role", None) == "Admin"):
             return User.objects.all()